@@ -3,8 +3,20 @@ import dash
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
+from utils.api import api
+from utils.evaluation import refresh_in_background
+from utils.http_cache import enable as enable_http_cache
+from utils.metrics import instrument
+from utils.page_cache import warm_up_in_background
+
 app = dash.Dash(__name__, use_pages=True, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.CYBORG])
 server = app.server
+server.register_blueprint(api)
+instrument(server)
+enable_http_cache(server)  # gzip/brotli, ETags and 304 Not Modified (after instrument, so sizes are as sent)
+if __name__ != "__mp_main__":  # not again in background job processes, which re-import this script
+    refresh_in_background()  # recompute the evaluation snapshot if the artifacts changed
+    warm_up_in_background()  # build page components ahead of the first visit (WARM_UP_PAGES=1)
 
 sidebar = dbc.Nav(
     [
@@ -12,6 +24,7 @@ sidebar = dbc.Nav(
         dbc.NavLink("Predict", href="/predict", active="exact"),
         dbc.NavLink("Dataset", href="/dataset", active="exact"),
         dbc.NavLink("Analysis", href="/analysis", active="exact"),
+        dbc.NavLink("Performance", href="/performance", active="exact"),
     ],
     vertical=True,
     pills=True,
@@ -0,0 +1,277 @@
+# Benchmarks for startup time, page payloads and prediction throughput.
+#
+#   python -m benchmarks.run --rows 10000 100000 --save benchmarks/baseline.json
+#   python -m benchmarks.run --rows 10000 100000 --compare benchmarks/baseline.json
+#
+# For every dataset size a synthetic dataset with the real columns (and the
+# StockCode/Country values the encoders know) is written to a temporary
+# directory, and the app is pointed at it through DATASET_PATH and the cache
+# directory variables. Each size is measured in fresh processes:
+#   - startup: `import app` with cold caches, then again with warm caches
+#   - pages: the page-routing callback for /, /dataset and /analysis (render
+#     time and JSON payload size), plus a sorted Dataset table page
+#   - predict: single-row latency through the Predict page callback and batch
+#     throughput through POST /api/predict, for every model in artifacts/,
+#     plus single-row latency of the compare-all mode
+# Results are written as JSON; --compare flags metrics that got worse than
+# the baseline by more than --tolerance (and, for timings, by more than
+# --min-delta seconds) and exits with status 1.
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["/", "/dataset", "/analysis"]
+PAGE_REPEATS = 5
+SINGLE_REPEATS = 200
+BATCH_ROWS = 100_000
+
+
+def synthetic_dataset(rows, seed=42):
+    # DataSet.xlsx-shaped frame of `rows` random transactions
+    sys.path.insert(0, ROOT)
+    from utils.encoders import load_encoders
+
+    encoders = load_encoders(os.path.join(ROOT, "artifacts", "encoders.json"))
+    products = np.array(encoders["ProductCode"].categories, dtype=object)
+    countries = np.array(encoders["CountryCode"].categories, dtype=object)
+
+    rng = np.random.default_rng(seed)
+    invoices = rng.integers(536365, 581587, rows)
+    start = np.datetime64("2010-12-01T08:00")
+    return pd.DataFrame({
+        "InvoiceNo": invoices.astype(str),
+        "StockCode": products[rng.integers(0, len(products), rows)],
+        "Description": "ITEM " + pd.Series(rng.integers(0, 4000, rows)).astype(str),
+        "Quantity": np.maximum(1, rng.lognormal(1.8, 1.1, rows).astype(int)),
+        "InvoiceDate": start + rng.integers(0, 373 * 24 * 60, rows).astype("timedelta64[m]"),
+        "UnitPrice": np.round(rng.lognormal(0.8, 0.8, rows), 2),
+        "CustomerID": rng.integers(12346, 18288, rows).astype(float),
+        "Country": countries[rng.integers(0, len(countries), rows)],
+    })
+
+
+def _environment(workdir):
+    # Point every data/cache location of the app into workdir
+    cache = os.path.join(workdir, "cache")
+    return dict(
+        os.environ,
+        DATASET_PATH=os.path.join(workdir, "DataSet.csv"),
+        DATASET_CACHE_DIR=os.path.join(cache, "dataset"),
+        FIGURE_CACHE_DIR=os.path.join(cache, "figures"),
+        METRICS_DIR=os.path.join(cache, "metrics"),
+        JOB_DIR=os.path.join(cache, "jobs"),
+        ROLLUP_CACHE_DIR=os.path.join(cache, "rollups"),
+        EVALUATION_PATH=os.path.join(workdir, "evaluation.json"),
+        EVALUATE_ON_START="0",
+        PYTHONWARNINGS="ignore",
+    )
+
+
+def _startup_seconds(env):
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def _callback(client, app, outputs, inputs, state=()):
+    # POST a Dash callback request the way the browser would; returns the response
+    wanted = [f"{i}.{p}" for i, p in outputs]
+    key = next(k for k in app.callback_map
+               if [part.split("@")[0] for part in k.strip(".").split("...")] == wanted)
+    body = {
+        "output": key,
+        "outputs": [{"id": i, "property": p} for i, p in outputs] if len(outputs) > 1
+        else {"id": outputs[0][0], "property": outputs[0][1]},
+        "inputs": [{"id": i, "property": p, "value": v} for i, p, v in inputs],
+        "state": [{"id": i, "property": p, "value": v} for i, p, v in state],
+        "changedPropIds": [f"{inputs[0][0]}.{inputs[0][1]}"],
+    }
+    response = client.post("/_dash-update-component", json=body)
+    if response.status_code != 200:
+        raise RuntimeError(f"Callback {key} failed with {response.status_code}")
+    return response
+
+
+def _timed(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def measure_app(rows, batch_rows):
+    # Runs inside a child process whose environment points at the synthetic data
+    import warnings
+    warnings.filterwarnings("ignore")
+    sys.path.insert(0, ROOT)
+    from app import app
+    from utils.model_registry import registry
+
+    client = app.server.test_client()
+    client.get("/")  # first request sets up the callback map
+    results = {}
+
+    for path in PAGES:
+        timings, response = _timed(lambda: _callback(
+            client, app, [("_pages_content", "children"), ("_pages_store", "data")],
+            [("_pages_location", "pathname", path), ("_pages_location", "search", "")]), PAGE_REPEATS)
+        name = path.strip("/") or "overview"
+        results[f"page_{name}_render_seconds"] = statistics.median(timings)
+        results[f"page_{name}_payload_bytes"] = len(response.data)
+
+    timings, _ = _timed(lambda: _callback(
+        client, app, [("dataset_table", "data"), ("dataset_table", "page_count")],
+        [("dataset_table", "page_current", 3), ("dataset_table", "page_size", 15),
+         ("dataset_table", "sort_by", [{"column_id": "UnitPrice", "direction": "desc"}]),
+         ("dataset_table", "filter_query", "")]), PAGE_REPEATS)
+    results["dataset_sorted_page_seconds"] = statistics.median(timings)
+
+    rng = np.random.default_rng(0)
+    batch = synthetic_dataset(min(rows, batch_rows), seed=1)
+    batch["Hour"] = batch["InvoiceDate"].dt.hour
+    batch["DayOfWeek"] = batch["InvoiceDate"].dt.dayofweek
+    batch_csv = batch[["StockCode", "UnitPrice", "Hour", "DayOfWeek", "Country"]].to_csv(index=False)
+
+    for model in registry.available() + ["__all__"]:
+        key = "compare_all" if model == "__all__" else model.lower().replace(" ", "_")
+
+        def single():
+            # Random prices, so the prediction cache does not answer for the model
+            values = [batch["StockCode"].iat[0], round(float(rng.uniform(0.1, 50)), 6),
+                      10, 2, batch["Country"].iat[0]]
+            return _callback(client, app, [("prediction_result", "children")],
+                             [("predict_btn", "n_clicks", 1)],
+                             [("model_choice", "value", model)]
+                             + [(f"input_{i}", "value", v) for i, v in enumerate(values)]
+                             + [("ensemble_toggle", "value", ["average"])])
+
+        single()  # loads the model
+        timings, _ = _timed(single, SINGLE_REPEATS)
+        results[f"predict_{key}_single_p50_seconds"] = float(np.percentile(timings, 50))
+        results[f"predict_{key}_single_p95_seconds"] = float(np.percentile(timings, 95))
+        if model == "__all__":
+            continue  # batch scoring takes a single model
+
+        start = time.perf_counter()
+        response = client.post(f"/api/predict?model={model}", data=batch_csv, content_type="text/csv")
+        body = response.get_data()
+        seconds = time.perf_counter() - start
+        scored = pd.read_csv(io.BytesIO(body))
+        if response.status_code != 200 or len(scored) != len(batch):
+            raise RuntimeError(f"Batch predict with {model} failed: {response.data[:200]!r}")
+        results[f"predict_{key}_batch_rows_per_second"] = len(batch) / seconds
+
+    return results
+
+
+def run_size(rows, batch_rows, keep=False):
+    # All metrics for one dataset size, prefixed with the size
+    workdir = tempfile.mkdtemp(prefix=f"bench-{rows}-")
+    try:
+        start = time.perf_counter()
+        synthetic_dataset(rows).to_csv(os.path.join(workdir, "DataSet.csv"), index=False)
+        print(f"[{rows} rows] dataset written in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        env = _environment(workdir)
+        results = {
+            "startup_cold_seconds": _startup_seconds(env),
+            "startup_warm_seconds": _startup_seconds(env),
+        }
+        out = subprocess.run([sys.executable, "-m", "benchmarks.run", "--measure",
+                              "--rows", str(rows), "--batch-rows", str(batch_rows)],
+                             cwd=ROOT, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"Measuring {rows} rows failed:\n{out.stderr}")
+        results.update(json.loads(out.stdout.strip().splitlines()[-1]))
+        return {f"rows_{rows}/{name}": value for name, value in results.items()}
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_second")
+
+
+def compare(current, baseline, tolerance, min_delta=0.0):
+    # -> list of (metric, baseline, current, change) worse than the tolerance.
+    # Timings that moved by less than min_delta seconds are treated as noise.
+    regressions = []
+    for metric, value in sorted(current.items()):
+        base = baseline.get(metric)
+        if not base:
+            continue
+        change = value / base - 1
+        worse = change < -tolerance / (1 + tolerance) if higher_is_better(metric) else change > tolerance
+        if metric.endswith("_seconds") and abs(value - base) < min_delta:
+            worse = False
+        print(f"{metric:60s} {base:14.6g} -> {value:14.6g} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append((metric, base, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark startup, page payloads and prediction throughput")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000],
+                        help="synthetic dataset sizes (default: %(default)s)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help="rows per batch prediction request, capped at --rows (default: %(default)s)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before flagging (default: %(default)s)")
+    parser.add_argument("--min-delta", type=float, default=0.002,
+                        help="ignore timing changes smaller than this many seconds (default: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary datasets")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure_app(args.rows[0], args.batch_rows)))
+        return 0
+
+    results = {}
+    for rows in args.rows:
+        results.update(run_size(rows, args.batch_rows, args.keep))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+        print("No regressions")
+    elif not args.save:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
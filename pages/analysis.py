@@ -1,168 +1,295 @@
 import dash
-from dash import html, dcc, dash_table
+from dash import html, dcc, dash_table, Input, Output, State, callback, ctx, no_update
 import plotly.graph_objs as go
-import plotly.figure_factory as ff
 import numpy as np
-import pandas as pd
-import plotly.express as px
-
-df = pd.read_excel("DataSet.xlsx")
-df = df[['CustomerID', 'Quantity', 'UnitPrice']]
-df.dropna(inplace=True)
-numeric_columns = df.select_dtypes(include='number').columns
-boxplots = []
-
-for col in numeric_columns:
-    fig = px.box(df, y=col, template="plotly_dark", title=f"Boxplot of {col}")
-    boxplots.append(fig)
-
-# 2. Correlation heatmap
-corr_fig = px.imshow(df.corr(),
-                     text_auto=True,
-                     color_continuous_scale='Blues',
-                     template="plotly_dark",
-                     title="Correlation Matrix")
-
-layout = html.Div([
-    html.H1("📊 Model Analysis Dashboard", style={
-        "textAlign": "center",
-        "color": "#2c3e50",
-        "marginBottom": "40px",
-        "fontWeight": "bold"
-    }),
+
+from utils.data_store import fingerprint, load_dataset
+from utils.encoders import ENCODED_COLUMNS
+from utils.evaluation import load_snapshot, metric_rows
+from utils.figure_cache import box_figure, cached_figure, correlation_figure
+from utils.page_cache import cached
+from utils.rollups import cube as rollup_cube
+from utils.scoring import RESTOCK_THRESHOLD
+
+numeric_columns = ['CustomerID', 'Quantity', 'UnitPrice']
+
+# Drill-down: each click on a bar filters on it and groups by the next level
+DRILL_LEVELS = ["CountryCode", "InvoiceMonth", "DayOfWeek", "Hour", "ProductCode"]
+DIMENSION_NAMES = {"CountryCode": "Country", "InvoiceMonth": "Month", "DayOfWeek": "Day of Week",
+                   "Hour": "Hour", "ProductCode": "Product"}
+MEASURE_LABELS = {
+    "revenue": "Revenue",
+    "quantity": "Quantity",
+    "count": "Transactions",
+    "mean_quantity": "Mean Quantity",
+    "quantity_p50": "Median Quantity (approx.)",
+    "quantity_p90": "90th Percentile Quantity (approx.)",
+}
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+TOP_PRODUCTS = 25
+
+
+def analysis_frame():
+    return load_dataset()[numeric_columns].dropna()
+
+
+def dataset_figures(dataset_version):
+    # 1. Boxplots and 2. correlation heatmap, computed once per dataset version
+    boxplots = [
+        cached_figure(f"box_{col}", dataset_version,
+                      lambda col=col: box_figure(analysis_frame()[col], col, f"Boxplot of {col}"))
+        for col in numeric_columns
+    ]
+    corr_fig = cached_figure("correlation", dataset_version, lambda: correlation_figure(analysis_frame()))
+    return boxplots, corr_fig
+
+# Metrics come from the evaluation snapshot of the current artifacts (see
+# utils/evaluation.py)
+def build_layout(snapshot, dataset_version):
+    boxplots, corr_fig = dataset_figures(dataset_version)
+    restock = {name: entry["restock"] for name, entry in (snapshot or {}).get("models", {}).items()}
+    forest = restock.get("Random Forest", {})
+    confusion = np.array([[forest.get("tn", 0), forest.get("fp", 0)], [forest.get("fn", 0), forest.get("tp", 0)]])
+    return html.Div([
+        html.H1("📊 Model Analysis Dashboard", style={
+            "textAlign": "center",
+            "color": "#2c3e50",
+            "marginBottom": "40px",
+            "fontWeight": "bold"
+        }),
     
     
     
-    # Performance Table Section
-    html.Div([
-        html.H3("Performance Metrics", style={"color": "#ecf0f1", "marginBottom": "20px"}),
-
-        dash_table.DataTable(
-            columns=[
-                {"name": "Model", "id": "Model"},
-                {"name": "Train RMSE (Std)", "id": "Train RMSE (Std)"},
-                {"name": "Test RMSE (Std)", "id": "Test RMSE (Std)"},
-                {"name": "Train MAE (Std)", "id": "Train MAE (Std)"},
-                {"name": "Test MAE (Std)", "id": "Test MAE (Std)"},
-                {"name": "Train RMSE (Orig)", "id": "Train RMSE (Orig)"},
-                {"name": "Test RMSE (Orig)", "id": "Test RMSE (Orig)"},
-                {"name": "Train MAE (Orig)", "id": "Train MAE (Orig)"},
-                {"name": "Test MAE (Orig)", "id": "Test MAE (Orig)"},
-                {"name": "Train R²", "id": "Train R²"},
-                {"name": "Test R²", "id": "Test R²"},
-                {"name": "CV R² (Mean)", "id": "CV R² (Mean)"},
-                {"name": "CV R² (Std)", "id": "CV R² (Std)"}
-            ],
-            data=[
-                {"Model": "Linear Regression", "Train RMSE (Std)": 1.090459, "Test RMSE (Std)": 0.323869, "Train MAE (Std)": 0.344243, "Test MAE (Std)": 0.265627, "Train RMSE (Orig)": 40.301383, "Test RMSE (Orig)": 11.969612, "Train MAE (Orig)": 12.722603, "Test MAE (Orig)": 9.817092, "Train R²": 0.035341, "Test R²": -0.442537, "CV R² (Mean)": -0.617647, "CV R² (Std)": 0.802494},
-                {"Model": "Random Forest", "Train RMSE (Std)": 0.623627, "Test RMSE (Std)": 0.376353, "Train MAE (Std)": 0.176098, "Test MAE (Std)": 0.213419, "Train RMSE (Orig)": 23.048114, "Test RMSE (Orig)": 13.909331, "Train MAE (Orig)": 6.508273, "Test MAE (Orig)": 7.887590, "Train R²": 0.684496, "Test R²": -0.947956, "CV R² (Mean)": -9.654443, "CV R² (Std)": 25.018885},
-                {"Model": "SVR", "Train RMSE (Std)": 1.114505, "Test RMSE (Std)": 0.275670, "Train MAE (Std)": 0.322586, "Test MAE (Std)": 0.232769, "Train RMSE (Orig)": 41.190088, "Test RMSE (Orig)": 10.188251, "Train MAE (Orig)": 11.922179, "Test MAE (Orig)": 8.602729, "Train R²": -0.007672, "Test R²": -0.045120, "CV R² (Mean)": None, "CV R² (Std)": None}
-            ],
-            style_cell={"textAlign": "center", "padding": "12px", "fontFamily": "Segoe UI", "fontSize": "15px"},
-            style_header={
-                "backgroundColor": "#2c3e50",
-                "color": "white",
-                "fontWeight": "bold"
-            },
-            style_data={
-                "backgroundColor": "#1e272e",
-                "color": "white"
-            },
-            style_table={
-                "overflowX": "auto",
-                "borderRadius": "10px",
-                "boxShadow": "0px 0px 10px rgba(255, 255, 255, 0.1)"
-            }
-        )
-    ], style={
-        "backgroundColor": "#2f3640",
-        "padding": "25px",
-        "marginBottom": "40px",
-        "borderRadius": "15px",
-        "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
-    }),
-
-    # Visual Comparison
-    html.Div([
-        html.H3("📊 Visual Comparison (Precision & Recall)", style={"color": "#ecf0f1", "marginBottom": "20px"}),
-
-        dcc.Graph(
-            figure=go.Figure(
-                data=[
-                    go.Bar(
-                        name="Precision",
-                        x=["Linear Regression", "Random Forest", "SVR"],
-                        y=[0.87, 0.96, 0.89],
-                        marker_color="#8e44ad"
-                    ),
-                    go.Bar(
-                        name="Recall",
-                        x=["Linear Regression", "Random Forest", "SVR"],
-                        y=[0.85, 0.91, 0.88],
-                        marker_color="#e67e22"
-                    )
+        # Performance Table Section
+        html.Div([
+            html.H3("Performance Metrics", style={"color": "#ecf0f1", "marginBottom": "20px"}),
+
+            dash_table.DataTable(
+                columns=[
+                    {"name": "Model", "id": "Model"},
+                    {"name": "Train RMSE (Std)", "id": "Train RMSE (Std)"},
+                    {"name": "Test RMSE (Std)", "id": "Test RMSE (Std)"},
+                    {"name": "Train MAE (Std)", "id": "Train MAE (Std)"},
+                    {"name": "Test MAE (Std)", "id": "Test MAE (Std)"},
+                    {"name": "Train RMSE (Orig)", "id": "Train RMSE (Orig)"},
+                    {"name": "Test RMSE (Orig)", "id": "Test RMSE (Orig)"},
+                    {"name": "Train MAE (Orig)", "id": "Train MAE (Orig)"},
+                    {"name": "Test MAE (Orig)", "id": "Test MAE (Orig)"},
+                    {"name": "Train R²", "id": "Train R²"},
+                    {"name": "Test R²", "id": "Test R²"},
+                    {"name": "CV R² (Mean)", "id": "CV R² (Mean)"},
+                    {"name": "CV R² (Std)", "id": "CV R² (Std)"}
                 ],
-                layout=go.Layout(
-                    barmode="group",
-                    title="Precision and Recall Across Models",
-                    title_font_color="#f1c40f",
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    font=dict(color="white"),
-                    transition_duration=500
+                data=metric_rows(snapshot),
+                style_cell={"textAlign": "center", "padding": "12px", "fontFamily": "Segoe UI", "fontSize": "15px"},
+                style_header={
+                    "backgroundColor": "#2c3e50",
+                    "color": "white",
+                    "fontWeight": "bold"
+                },
+                style_data={
+                    "backgroundColor": "#1e272e",
+                    "color": "white"
+                },
+                style_table={
+                    "overflowX": "auto",
+                    "borderRadius": "10px",
+                    "boxShadow": "0px 0px 10px rgba(255, 255, 255, 0.1)"
+                }
+            )
+        ], style={
+            "backgroundColor": "#2f3640",
+            "padding": "25px",
+            "marginBottom": "40px",
+            "borderRadius": "15px",
+            "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
+        }),
+
+        # Visual Comparison
+        html.Div([
+            html.H3("📊 Visual Comparison (Precision & Recall)", style={"color": "#ecf0f1", "marginBottom": "20px"}),
+
+            dcc.Graph(
+                figure=go.Figure(
+                    data=[
+                        go.Bar(
+                            name="Precision",
+                            x=list(restock),
+                            y=[counts["precision"] for counts in restock.values()],
+                            marker_color="#8e44ad"
+                        ),
+                        go.Bar(
+                            name="Recall",
+                            x=list(restock),
+                            y=[counts["recall"] for counts in restock.values()],
+                            marker_color="#e67e22"
+                        )
+                    ],
+                    layout=go.Layout(
+                        barmode="group",
+                        title=f"Restock Precision and Recall Across Models (held-out rows, > {RESTOCK_THRESHOLD} units)",
+                        title_font_color="#f1c40f",
+                        plot_bgcolor="rgba(0,0,0,0)",
+                        paper_bgcolor="rgba(0,0,0,0)",
+                        font=dict(color="white"),
+                        transition_duration=500
+                    )
                 )
             )
-        )
         
-    ], style={
-        "backgroundColor": "#2f3640",
-        "padding": "25px",
-        "marginBottom": "40px",
-        "borderRadius": "15px",
-        "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
-    }),
-
-    # Confusion Matrix
-    html.Div([
-        html.H3("🧠 Confusion Matrix: Random Forest", style={"color": "#ecf0f1", "marginBottom": "20px"}),
-
-        dcc.Graph(
-            figure=ff.create_annotated_heatmap(
-                z=np.array([[82, 18], [13, 87]]),
-                x=["Predicted Negative", "Predicted Positive"],
-                y=["Actual Negative", "Actual Positive"],
-                colorscale="Blues",
-                showscale=True
-            )
-        ),
+        ], style={
+            "backgroundColor": "#2f3640",
+            "padding": "25px",
+            "marginBottom": "40px",
+            "borderRadius": "15px",
+            "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
+        }),
 
+        # Confusion Matrix
         html.Div([
-        html.H2("Boxplots of Numeric Columns"),
-        *[dcc.Graph(figure=fig) for fig in boxplots]
-    ]),
+            html.H3("🧠 Confusion Matrix: Random Forest (restock decision)", style={"color": "#ecf0f1", "marginBottom": "20px"}),
+
+            dcc.Graph(
+                # Annotated heatmap (plain go.Heatmap: figure_factory pulls in scipy at import)
+                figure=go.Figure(go.Heatmap(
+                    z=confusion,
+                    x=["Predicted Negative", "Predicted Positive"],
+                    y=["Actual Negative", "Actual Positive"],
+                    text=confusion,
+                    texttemplate="%{text}",
+                    colorscale="Blues",
+                    showscale=True
+                ))
+            ),
+
+            html.Div([
+            html.H2("Boxplots of Numeric Columns"),
+            *[dcc.Graph(figure=fig) for fig in boxplots]
+        ]),
+
+        html.Div([
+            html.H2("Correlation Matrix"),
+            dcc.Graph(figure=corr_fig)
+        ]),
+
+
+        ], style={
+            "backgroundColor": "#2f3640",
+            "padding": "25px",
+            "marginBottom": "40px",
+            "borderRadius": "15px",
+            "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
+        }),
+
+        # Drill-down over the rollup cube (utils/rollups.py); filled by callbacks
+        html.Div([
+            html.H3("🔎 Sales Drill-down", style={"color": "#ecf0f1", "marginBottom": "20px"}),
+            html.Div([
+                dcc.Dropdown(
+                    id="rollup_measure",
+                    options=[{"label": label, "value": value} for value, label in MEASURE_LABELS.items()],
+                    value="revenue",
+                    clearable=False,
+                    style={"width": "300px", "color": "black"}
+                ),
+                html.Button("Reset", id="rollup_reset", n_clicks=0, className="btn btn-secondary",
+                            style={"marginLeft": "15px"}),
+            ], style={"display": "flex", "alignItems": "center", "marginBottom": "10px"}),
+            html.Div(id="rollup_breadcrumb", style={"color": "#aaa", "marginBottom": "10px"}),
+            dcc.Store(id="rollup_path", data=[]),
+            dcc.Graph(id="rollup_chart"),
+        ], style={
+            "backgroundColor": "#2f3640",
+            "padding": "25px",
+            "borderRadius": "15px",
+            "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
+        })
 
-    html.Div([
-        html.H2("Correlation Matrix"),
-        dcc.Graph(figure=corr_fig)
-    ]),
 
 
     ], style={
-        "backgroundColor": "#2f3640",
-        "padding": "25px",
-        "borderRadius": "15px",
-        "boxShadow": "0px 4px 20px rgba(0, 0, 0, 0.4)"
+        "padding": "40px",
+        "backgroundColor": "#1a1a1a",
+        "minHeight": "100vh"
     })
-    
-    
-    
-], style={
-    "padding": "40px",
-    "backgroundColor": "#1a1a1a",
-    "minHeight": "100vh"
-})
+
+
+def layout(**kwargs):
+    # Built on the first visit, then reused until the dataset or snapshot changes
+    snapshot = load_snapshot()
+    dataset_version = fingerprint()
+    return cached("analysis_layout", (dataset_version, snapshot and snapshot["created"]),
+                  lambda: build_layout(snapshot, dataset_version))
+
 
 dash.register_page(__name__, path="/analysis")
 
 
+def _labels(dimension, keys):
+    # Display labels for the keys of one drill level
+    if dimension in ENCODED_COLUMNS:
+        # The codes of the cube's own encoders (the dataset may hold values the artifact doesn't)
+        categories = rollup_cube().encoders[dimension].categories
+        return [categories[k] if 0 <= k < len(categories) else str(k) for k in keys]
+    if dimension == "DayOfWeek":
+        return [DAY_NAMES[k] for k in keys]
+    if dimension == "Hour":
+        return [f"{k:02d}:00" for k in keys]
+    return [str(k) for k in keys]
+
+
+@callback(
+    Output("rollup_path", "data"),
+    Input("rollup_chart", "clickData"),
+    Input("rollup_reset", "n_clicks"),
+    State("rollup_path", "data"),
+    prevent_initial_call=True
+)
+def drill(click, _, path):
+    # Clicking a bar filters on it and moves to the next level
+    if ctx.triggered_id == "rollup_reset" or not click:
+        return []
+    if len(path) >= len(DRILL_LEVELS) - 1:
+        return no_update
+    value = click["points"][0]["customdata"]
+    return path + [{"dimension": DRILL_LEVELS[len(path)], "value": value[0] if isinstance(value, list) else value}]
+
+
+@callback(
+    Output("rollup_chart", "figure"),
+    Output("rollup_breadcrumb", "children"),
+    Input("rollup_path", "data"),
+    Input("rollup_measure", "value"),
+)
+def render_rollup(path, measure):
+    dimension = DRILL_LEVELS[len(path)]
+    filters = {step["dimension"]: [step["value"]] for step in path}
+    result = rollup_cube().query(dimension, filters)
+    if dimension == "ProductCode":
+        result = result.nlargest(TOP_PRODUCTS, measure)
+    elif dimension != "InvoiceMonth":
+        result = result.sort_values(dimension)
+
+    keys = result[dimension].tolist()
+    fig = go.Figure(go.Bar(
+        x=_labels(dimension, keys),
+        y=result[measure],
+        customdata=keys,
+        marker_color="#1abc9c",
+        hovertemplate="%{x}<br>%{y:,.2f}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"{MEASURE_LABELS[measure]} by {DIMENSION_NAMES[dimension]}",
+        xaxis=dict(type="category"),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white")
+    )
+
+    steps = [f"{DIMENSION_NAMES[step['dimension']]}: {_labels(step['dimension'], [step['value']])[0]}"
+             for step in path]
+    hint = "" if len(path) == len(DRILL_LEVELS) - 1 else " (click a bar to drill down)"
+    return fig, " › ".join(["All"] + steps) + hint
+
+
 
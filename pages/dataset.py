@@ -1,19 +1,22 @@
 import dash
-from dash import html, dcc, dash_table
-import pandas as pd
+from dash import html, dcc, dash_table, Input, Output, callback
 
-# Try reading the Excel file
-try:
-    df = pd.read_excel("DataSet.xlsx")
-except Exception as e:
-    print(f"Error reading the Excel file: {e}")
-    df = pd.DataFrame()  # Return an empty DataFrame if there's an error
+from utils.data_store import fingerprint, load_dataset
+from utils.page_cache import cached
+from utils.table_query import query_page
 
-# Now check if DataFrame is empty
-if df.empty:
-    print("Dataset is empty or failed to load. Please check the Excel file.")
-else:
-    layout = html.Div([
+PAGE_SIZE = 15
+
+
+def message(text):
+    return html.Div([
+        html.H1("📊 Dataset Viewer", style={'textAlign': 'center', 'color': '#2c3e50', 'fontWeight': 'bold'}),
+        html.P(text, style={'textAlign': 'center', 'color': '#ecf0f1'})
+    ], style={'backgroundColor': '#1a1a1a', 'minHeight': '100vh', 'padding': '40px'})
+
+
+def build_layout(df):
+    return html.Div([
         html.H1("📊 Dataset Viewer", style={
             'textAlign': 'center',
             'color': '#2c3e50',
@@ -22,10 +25,18 @@ else:
         }),
 
         html.Div([
+            # Paging, sorting and filtering happen server side (see update_table)
             dash_table.DataTable(
-                data=df.to_dict('records'),
+                id='dataset_table',
                 columns=[{"name": i, "id": i} for i in df.columns],
-                page_size=15,
+                page_current=0,
+                page_size=PAGE_SIZE,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 style_table={
                     'height': '500px',
                     'overflowY': 'auto',
@@ -99,4 +110,32 @@ else:
         'padding': '40px'
     })
 
+
+def layout(**kwargs):
+    # Load the dataset (memory-mapped columnar cache of DataSet.xlsx) on the
+    # first visit rather than at import; the table is built once per version
+    try:
+        df = load_dataset()
+    except Exception as e:
+        print(f"Error reading the Excel file: {e}")
+        return message("The dataset could not be loaded. Please check the Excel file.")
+
+    if df.empty:
+        print("Dataset is empty or failed to load. Please check the Excel file.")
+        return message("The dataset is empty.")
+    return cached("dataset_layout", fingerprint(), lambda: build_layout(df))
+
+
+@callback(
+    Output('dataset_table', 'data'),
+    Output('dataset_table', 'page_count'),
+    Input('dataset_table', 'page_current'),
+    Input('dataset_table', 'page_size'),
+    Input('dataset_table', 'sort_by'),
+    Input('dataset_table', 'filter_query')
+)
+def update_table(page_current, page_size, sort_by, filter_query):
+    return query_page(load_dataset(), page_current, page_size, sort_by, filter_query)
+
+
 dash.register_page(__name__, path="/dataset")
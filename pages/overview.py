@@ -1,115 +1,155 @@
 import dash
-from dash import html, dcc
+from dash import html, dcc, Input, Output, State, callback, no_update
 import dash_bootstrap_components as dbc
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
-import numpy as np
+
+from utils.downsample import MAX_POINTS, scatter_trace, thin, zoom_ranges
+from utils.evaluation import load_predictions, load_snapshot, metric_rows
+from utils.page_cache import cached
 
 dash.register_page(__name__, path="/")
 
 
-fig_pie = px.pie(values=[9, 7, 8], names=["Linear Regression", "Random Forest", "SVR"], title="Model Distribution by MAE")
-fig_pie.update_layout(
-    paper_bgcolor="#1e1e1e",
-    font=dict(color="white"),
-    title_font_size=20
-)
+CARD_MODELS = ["SVR", "Linear Regression", "Random Forest"]
+SCATTER_STYLES = {
+    "Random Forest": dict(symbol='circle', color='lightblue'),
+    "SVR": dict(symbol='square', color='orange'),
+    "Linear Regression": dict(symbol='diamond', color='lightgreen'),
+    "SGD Regressor": dict(symbol='triangle-up', color='violet'),
+}
 
 
-np.random.seed(42)
-y_actual = np.linspace(50, 150, 24) + np.random.normal(0, 3, 24)
-y_rf = y_actual + np.random.normal(0, 5, 24)
-y_svr = y_actual + np.random.normal(0, 7, 24)
-
-# 📌 New: Create scatter plot comparing Random Forest vs SVR
-fig_pred_vs_actual = go.Figure()
-fig_pred_vs_actual.add_trace(go.Scatter(x=y_actual, y=y_rf, mode='markers', name='Random Forest',
-                                        marker=dict(symbol='circle', color='lightblue')))
-fig_pred_vs_actual.add_trace(go.Scatter(x=y_actual, y=y_svr, mode='markers', name='SVR',
-                                        marker=dict(symbol='square', color='orange')))
-fig_pred_vs_actual.add_trace(go.Scatter(x=[y_actual.min(), y_actual.max()], y=[y_actual.min(), y_actual.max()],
-                                        mode='lines', name='Ideal Prediction', line=dict(dash='dash', color='red')))
-
-fig_pred_vs_actual.update_layout(
-    title="Predicted vs Actual Quantity: RF vs SVR",
-    xaxis_title="Actual Quantity",
-    yaxis_title="Predicted Quantity",
-    plot_bgcolor="#1e1e1e",
-    paper_bgcolor="#1e1e1e",
-    font=dict(color="white"),
-    title_font_size=20
-)
+def mae_pie(snapshot):
+    # Test MAE (original units) of every evaluated model
+    rows = metric_rows(snapshot)
+    fig_pie = px.pie(values=[row["Test MAE (Orig)"] for row in rows], names=[row["Model"] for row in rows],
+                     title="Model Distribution by MAE")
+    fig_pie.update_layout(
+        paper_bgcolor="#1e1e1e",
+        font=dict(color="white"),
+        title_font_size=20
+    )
+    return fig_pie
+
+
+def pred_vs_actual(snapshot, view=(None, None)):
+    # Predicted vs actual quantity on the held-out rows, thinned to the visible
+    # area (x/y ranges in view) so the payload stays bounded; the snapshot's
+    # sample stands in when the full predictions are not available
+    predictions = load_predictions() or {}
+    fig_pred_vs_actual = go.Figure()
+    low = high = 0
+    for name, entry in (snapshot or {}).get("models", {}).items():
+        if name in predictions:
+            actual, predicted = predictions["actual"], predictions[name]
+        else:
+            actual, predicted = np.asarray(entry["sample"]["actual"]), np.asarray(entry["sample"]["predicted"])
+        keep = thin(actual, predicted, MAX_POINTS, *view)
+        fig_pred_vs_actual.add_trace(scatter_trace(actual[keep], predicted[keep], mode='markers', name=name,
+                                                   marker=SCATTER_STYLES.get(name, {})))
+        if len(actual):
+            low, high = min(low, actual.min()), max(high, actual.max())
+    fig_pred_vs_actual.add_trace(go.Scatter(x=[low, high], y=[low, high],
+                                            mode='lines', name='Ideal Prediction', line=dict(dash='dash', color='red')))
+
+    fig_pred_vs_actual.update_layout(
+        title="Predicted vs Actual Quantity (held-out rows)",
+        xaxis_title="Actual Quantity",
+        yaxis_title="Predicted Quantity",
+        plot_bgcolor="#1e1e1e",
+        paper_bgcolor="#1e1e1e",
+        font=dict(color="white"),
+        title_font_size=20,
+        uirevision="pred_vs_actual"  # keep the user's zoom when the figure is re-fetched
+    )
+    if view[0] is not None:
+        fig_pred_vs_actual.update_xaxes(range=view[0])
+    if view[1] is not None:
+        fig_pred_vs_actual.update_yaxes(range=view[1])
+    return fig_pred_vs_actual
 
-# 📌 Model Metrics Data
-model_data = [
-    {"Model": "Linear Regression", "Train RMSE (Std)": 1.090459, "Test RMSE (Std)": 0.323869, "Train MAE (Std)": 0.344243, "Test MAE (Std)": 0.265627, "Train RMSE (Orig)": 40.301383, "Test RMSE (Orig)": 11.969612, "Train MAE (Orig)": 12.722603, "Test MAE (Orig)": 9.817092, "Train R²": 0.035341, "Test R²": -0.442537, "CV R² (Mean)": -0.617647, "CV R² (Std)": 0.802494},
-    {"Model": "Random Forest", "Train RMSE (Std)": 0.623627, "Test RMSE (Std)": 0.376353, "Train MAE (Std)": 0.176098, "Test MAE (Std)": 0.213419, "Train RMSE (Orig)": 23.048114, "Test RMSE (Orig)": 13.909331, "Train MAE (Orig)": 6.508273, "Test MAE (Orig)": 7.887590, "Train R²": 0.684496, "Test R²": -0.947956, "CV R² (Mean)": -9.654443, "CV R² (Std)": 25.018885},
-    {"Model": "SVR", "Train RMSE (Std)": 1.114505, "Test RMSE (Std)": 0.275670, "Train MAE (Std)": 0.322586, "Test MAE (Std)": 0.232769, "Train RMSE (Orig)": 41.190088, "Test RMSE (Orig)": 10.188251, "Train MAE (Orig)": 11.922179, "Test MAE (Orig)": 8.602729, "Train R²": -0.007672, "Test R²": -0.045120, "CV R² (Mean)": None, "CV R² (Std)": None}
-]
 
-# Convert to DataFrame
-df_model_metrics = pd.DataFrame(model_data)
+def metric_card(title, metrics):
+    value = metrics.get("Train RMSE (Std)") if metrics else None
+    text = f"Train RMSE: {value:.2f}" if value is not None else "Train RMSE: n/a"
+    return dbc.Col(dbc.Card([
+        dbc.CardBody([
+            html.H4(title, className="card-title"),
+            html.H2(text, className="card-text")
+        ])
+    ], className="shadow-sm", style={"backgroundColor": "#34495e", "color": "white", "borderRadius": "12px"}), width=4)
+
 
 # Layout
-layout = html.Div([
-    html.H1("🔍 Dashboard Overview", style={
-        'textAlign': 'center',
-        'color': '#2c3e50',
-        'marginBottom': '40px',
-        'fontWeight': 'bold'
-    }),
-
-    # Metrics Cards
-    dbc.Row([
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H4("Support Vector Regression", className="card-title"),
-                html.H2(f"Train RMSE: {df_model_metrics.loc[2, 'Train RMSE (Std)']:.2f}", className="card-text")
-            ])
-        ], className="shadow-sm", style={"backgroundColor": "#34495e", "color": "white", "borderRadius": "12px"}), width=4),
-
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H4("Linear Regression", className="card-title"),
-                html.H2(f"Train RMSE: {df_model_metrics.loc[0, 'Train RMSE (Std)']:.2f}", className="card-text")
-            ])
-        ], className="shadow-sm", style={"backgroundColor": "#34495e", "color": "white", "borderRadius": "12px"}), width=4),
-
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H4("Random Forest", className="card-title"),
-                html.H2(f"Train RMSE: {df_model_metrics.loc[1, 'Train RMSE (Std)']:.2f}", className="card-text")
-            ])
-        ], className="shadow-sm", style={"backgroundColor": "#34495e", "color": "white", "borderRadius": "12px"}), width=4),
-    ], className="mb-4"),
-
-     # 📌 New Graph Section
-    dbc.Row([
-        dbc.Col(dcc.Graph(figure=fig_pred_vs_actual), width=6),
-        dbc.Col(dcc.Graph(figure=fig_pie), width=6)
-    ], className="mb-5"),
+def build_layout(snapshot):
+    metrics = {row["Model"]: row for row in metric_rows(snapshot)}
+    return html.Div([
+        html.H1("🔍 Dashboard Overview", style={
+            'textAlign': 'center',
+            'color': '#2c3e50',
+            'marginBottom': '40px',
+            'fontWeight': 'bold'
+        }),
+
+        # Metrics Cards (from the evaluation snapshot of the current artifacts)
+        dbc.Row([
+            metric_card("Support Vector Regression" if name == "SVR" else name, metrics.get(name))
+            for name in CARD_MODELS
+        ], className="mb-4"),
+
+         # 📌 New Graph Section
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='pred_vs_actual', figure=pred_vs_actual(snapshot)),
+                dcc.Store(id='pred_vs_actual_view', data=[None, None]),
+            ], width=6),
+            dbc.Col(dcc.Graph(figure=mae_pie(snapshot)), width=6)
+        ], className="mb-5"),
 
    
    
-    # Download Report
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.H5("📄 Download Report", className="text-center", style={"color": "#ecf0f1", "marginBottom": "10px"}),
+        # Download Report
+        dbc.Row([
+            dbc.Col([
                 html.Div([
-                    html.A(
-                        html.Button("Download PDF Report", className="btn btn-success btn-lg"),
-                        href="/assets/Project_Report.pdf",
-                        download="Report.pdf"
-                    )
-                ], className="d-flex justify-content-center")
-            ], style={
-                "backgroundColor": "#2c3e50",
-                "padding": "30px",
-                "borderRadius": "12px",
-                "boxShadow": "0px 4px 12px rgba(0,0,0,0.4)"
-            })
-        ], width=12)
-    ])
-], className="p-4", style={"backgroundColor": "#1a1a1a", "minHeight": "100vh"})
+                    html.H5("📄 Download Report", className="text-center", style={"color": "#ecf0f1", "marginBottom": "10px"}),
+                    html.Div([
+                        html.A(
+                            html.Button("Download PDF Report", className="btn btn-success btn-lg"),
+                            href="/assets/Project_Report.pdf",
+                            download="Report.pdf"
+                        )
+                    ], className="d-flex justify-content-center")
+                ], style={
+                    "backgroundColor": "#2c3e50",
+                    "padding": "30px",
+                    "borderRadius": "12px",
+                    "boxShadow": "0px 4px 12px rgba(0,0,0,0.4)"
+                })
+            ], width=12)
+        ])
+    ], className="p-4", style={"backgroundColor": "#1a1a1a", "minHeight": "100vh"})
+
+
+def layout(**kwargs):
+    # Built on the first visit, then reused until the evaluation snapshot changes
+    snapshot = load_snapshot()
+    return cached("overview_layout", snapshot and snapshot["created"], lambda: build_layout(snapshot))
+
+
+# Zooming re-fetches the chart with the detail of the visible area
+@callback(
+    Output('pred_vs_actual', 'figure'),
+    Output('pred_vs_actual_view', 'data'),
+    Input('pred_vs_actual', 'relayoutData'),
+    State('pred_vs_actual_view', 'data'),
+    prevent_initial_call=True
+)
+def zoom_pred_vs_actual(relayout, view):
+    view = view or [None, None]
+    zoomed = zoom_ranges(relayout, view)
+    if zoomed == view:
+        return no_update, no_update
+    return pred_vs_actual(load_snapshot(), zoomed), zoomed
@@ -0,0 +1,117 @@
+import dash
+from dash import html, dcc, dash_table, Input, Output, callback
+
+from utils.metrics import histogram_summary, worker_snapshots
+
+REFRESH_MS = 5000
+
+table_style = dict(
+    style_table={'overflowX': 'auto', 'marginBottom': '30px'},
+    style_cell={
+        'textAlign': 'left',
+        'padding': '8px',
+        'border': '1px solid #333',
+        'fontFamily': 'Arial, sans-serif',
+        'fontSize': '13px',
+        'backgroundColor': '#1a1a1a',
+        'color': '#ecf0f1',
+        'whiteSpace': 'normal',
+        'height': 'auto',
+    },
+    style_header={
+        'backgroundColor': 'white',
+        'color': 'black',
+        'fontWeight': 'bold',
+        'border': 'none'
+    },
+)
+
+
+def layout(**kwargs):
+    return html.Div([
+        html.H1("⏱️ Performance", style={
+            'textAlign': 'center',
+            'color': '#2c3e50',
+            'marginBottom': '30px',
+            'fontWeight': 'bold'
+        }),
+
+        dcc.Interval(id='perf_refresh', interval=REFRESH_MS),
+        html.P("Live numbers from every worker (also at /metrics for Prometheus). "
+               "Percentiles are bucket upper bounds.", style={'color': '#aaa'}),
+
+        html.H3("Workers", style={'color': 'white'}),
+        dash_table.DataTable(id='perf_workers', **table_style),
+
+        html.H3("Latency and sizes", style={'color': 'white'}),
+        dash_table.DataTable(id='perf_histograms', sort_action='native', **table_style),
+
+        html.H3("Counters and gauges", style={'color': 'white'}),
+        dash_table.DataTable(id='perf_values', sort_action='native', **table_style),
+    ], style={'padding': '20px'})
+
+
+dash.register_page(__name__, path="/performance")
+
+
+def _format_histogram_row(row):
+    # Seconds are shown in ms, sizes and row counts as they are
+    timed = row['metric'].endswith('_seconds')
+    scale, unit = (1000, ' ms') if timed else (1, '')
+
+    def fmt(value):
+        if value == float('inf'):
+            return '> last bucket'
+        return f"{value * scale:,.1f}{unit}" if timed else f"{value:,.0f}"
+
+    return {
+        'metric': row['metric'],
+        'labels': row['labels'],
+        'count': row['count'],
+        'mean': fmt(row['mean']),
+        'p50': fmt(row['p50']),
+        'p95': fmt(row['p95']),
+        'p99': fmt(row['p99']),
+    }
+
+
+@callback(
+    Output('perf_workers', 'data'),
+    Output('perf_workers', 'columns'),
+    Output('perf_histograms', 'data'),
+    Output('perf_histograms', 'columns'),
+    Output('perf_values', 'data'),
+    Output('perf_values', 'columns'),
+    Input('perf_refresh', 'n_intervals'),
+)
+def refresh(_):
+    snapshots = worker_snapshots()
+
+    workers, values = [], []
+    for snapshot in snapshots:
+        gauges = {name: value for name, labels, value in snapshot['gauges'] if not labels}
+        requests = sum(value for name, _, value in snapshot['counters'] if name == 'http_requests_total')
+        workers.append({
+            'worker': snapshot['pid'],
+            'requests': requests,
+            'rss_mb': round(gauges.get('process_resident_memory_bytes', 0) / 2 ** 20, 1),
+            'peak_rss_mb': round(gauges.get('process_peak_resident_memory_bytes', 0) / 2 ** 20, 1),
+        })
+        for name, labels, value in snapshot['counters'] + snapshot['gauges']:
+            if name.startswith('process_') or name == 'http_requests_total':
+                continue
+            values.append({
+                'worker': snapshot['pid'],
+                'metric': name,
+                'labels': ', '.join(f"{k}={v}" for k, v in labels.items()),
+                'value': round(value, 4),
+            })
+
+    histograms = [_format_histogram_row(row) for row in histogram_summary(snapshots)]
+
+    def columns(rows, fallback):
+        return [{"name": c, "id": c} for c in (rows[0].keys() if rows else fallback)]
+
+    return (workers, columns(workers, ['worker']),
+            histograms, columns(histograms, ['metric']),
+            values, columns(values, ['metric']))
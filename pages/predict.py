@@ -1,15 +1,21 @@
+import base64
+import os
+import uuid
+
 import dash
-from dash import html, dcc, Input, Output, State, callback
-import joblib
-import numpy as np
-
-# Load models and scaler
-models = {
-    "SVM": joblib.load("artifacts/SVR.pkl"),
-    "Random Forest": joblib.load("artifacts/Random_Forest.pkl"),
-    "Logistic Regression": joblib.load("artifacts/Linear_Regression.pkl"),
-}
-scaler = joblib.load("artifacts/scaler.pkl")  # expects 2 features: UnitPrice, Quantity
+from dash import html, dcc, Input, Output, State, callback, ctx
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+
+from utils import jobs
+from utils.data_store import DATASET_PATH
+from utils.encoders import ENCODED_COLUMNS
+from utils.ingest import STORE_DIR
+from utils.model_registry import registry
+from utils.page_cache import cached
+from utils.scoring import FEATURES, RESTOCK_THRESHOLD, predict_all, predict_one, resolve_code
+
+COMPARE_ALL = "__all__"  # model_choice value that scores the input with every model
 
 # Styles
 container_style = {
@@ -40,48 +46,114 @@ predict_button_style = {
 }
 
 # Layout
-layout = html.Div([    
-    html.H1("🔍 Make a Prediction", style={
-        'textAlign': 'center',
-        'color': '#2c3e50',
-        'marginBottom': '30px',
-        'fontWeight': 'bold'
-    }),
-
-    html.Div([
-        html.Label("Choose a Model", style={
-            'fontWeight': 'bold',
-            'color': '#ecf0f1',
-            'marginBottom': '10px',
-            'display': 'block'
-        }),
-        dcc.Dropdown(
-            id='model_choice',
-            options=[{'label': k, 'value': k} for k in models.keys()],
-            placeholder="Select a Machine Learning Model",
-            className='dark-dropdown',
-            style={'marginBottom': '20px'}
-        ),
-
-        html.Div(id='input_fields', style={'marginBottom': '20px'}),
-
-        html.Button("Predict", id="predict_btn", n_clicks=0,
-                    style={**predict_button_style, 'opacity': 0.5, 'cursor': 'not-allowed'},
-                    disabled=True),
-
-        html.Div(id='prediction_result', style={
-            'marginTop': '30px',
-            'fontSize': '20px',
-            'fontWeight': 'bold',
-            'color': '#2ecc71',
-            'textAlign': 'center'
+def build_layout(models):
+    return html.Div([
+        html.H1("🔍 Make a Prediction", style={
+            'textAlign': 'center',
+            'color': '#2c3e50',
+            'marginBottom': '30px',
+            'fontWeight': 'bold'
         }),
-    ], style=container_style)
-], style={
-    'backgroundColor': '#1a1a1a',
-    'minHeight': '100vh',
-    'padding': '40px'
-})
+
+        html.Div([
+            html.Label("Choose a Model", style={
+                'fontWeight': 'bold',
+                'color': '#ecf0f1',
+                'marginBottom': '10px',
+                'display': 'block'
+            }),
+            dcc.Dropdown(
+                id='model_choice',
+                options=[{'label': k, 'value': k} for k in models]
+                + ([{'label': "Compare all models", 'value': COMPARE_ALL}] if len(models) > 1 else []),
+                placeholder="Select a Machine Learning Model",
+                className='dark-dropdown',
+                style={'marginBottom': '20px'}
+            ),
+
+            html.Div(
+                dcc.Checklist(
+                    id='ensemble_toggle',
+                    options=[{'label': " Add the ensemble average", 'value': 'average'}],
+                    value=['average'],
+                    style={'color': '#ecf0f1'}
+                ),
+                id='ensemble_options',
+                style={'display': 'none'}
+            ),
+
+            html.Div(id='input_fields', style={'marginBottom': '20px'}),
+
+            html.Button("Predict", id="predict_btn", n_clicks=0,
+                        style={**predict_button_style, 'opacity': 0.5, 'cursor': 'not-allowed'},
+                        disabled=True),
+
+            html.Div(id='prediction_result', style={
+                'marginTop': '30px',
+                'fontSize': '20px',
+                'fontWeight': 'bold',
+                'color': '#2ecc71',
+                'textAlign': 'center'
+            }),
+        ], style=container_style),
+
+        # Batch scoring: upload a CSV with one row per product
+        html.Div([
+            html.Label("Batch Prediction (CSV)", style={
+                'fontWeight': 'bold',
+                'color': '#ecf0f1',
+                'marginBottom': '10px',
+                'display': 'block'
+            }),
+            html.P(f"Columns: {', '.join(FEATURES)} (or StockCode/Country instead of the codes). "
+                   "Uses the model chosen above.",
+                   style={'color': '#bdc3c7', 'fontSize': '14px'}),
+            dcc.Upload(
+                id='batch_upload',
+                children=html.Div(["Drag and drop or ", html.A("select a CSV file")]),
+                accept='.csv,text/csv',
+                style={
+                    'padding': '20px',
+                    'border': '1px dashed #555',
+                    'borderRadius': '5px',
+                    'textAlign': 'center',
+                    'color': '#ecf0f1',
+                    'cursor': 'pointer'
+                }
+            ),
+            html.Button("Retrain Models", id="retrain_btn", n_clicks=0,
+                        style={**predict_button_style, 'backgroundColor': '#8e44ad', 'marginTop': '20px'}),
+
+            # Batch scoring and retraining run as background jobs; the page polls them
+            dcc.Store(id='job_id'),
+            dcc.Interval(id='job_poll', interval=1000, disabled=True),
+            dbc.Progress(id='job_progress', value=0, striped=True, animated=True,
+                         style={'marginTop': '20px', 'display': 'none'}),
+            html.Div(id='batch_result', style={
+                'marginTop': '20px',
+                'color': '#2ecc71',
+                'textAlign': 'center'
+            }),
+            html.Div([
+                html.Button("Cancel", id="cancel_job_btn", n_clicks=0,
+                            style={**predict_button_style, 'backgroundColor': '#c0392b', 'display': 'none'}),
+                html.Button("Download results", id="download_btn", n_clicks=0,
+                            style={**predict_button_style, 'display': 'none'}),
+            ], style={'marginTop': '10px', 'textAlign': 'center'}),
+            dcc.Download(id='batch_download'),
+        ], style={**container_style, 'marginTop': '30px'})
+    ], style={
+        'backgroundColor': '#1a1a1a',
+        'minHeight': '100vh',
+        'padding': '40px'
+    })
+
+
+def layout(**kwargs):
+    # Model choices follow the artifacts present on disk
+    models = registry.available()
+    return cached("predict_layout", tuple(models), lambda: build_layout(models))
+
 
 # Update inputs based on model choice
 @callback(
@@ -92,15 +164,15 @@ def update_inputs(model_name):
     if not model_name:
         return ""
     
-    # Adjusted input fields based on new inputs
-    fields = ['ProductCode', 'UnitPrice', 'Hour', 'DayOfWeek', 'CountryCode']
+    # Adjusted input fields based on new inputs. The two code fields also
+    # accept the raw StockCode / Country, looked up in the saved encoders.
     return [
         dcc.Input(
             id=f'input_{i}',
-            type='number',
-            placeholder=f'{field}',
+            type='text' if field in ENCODED_COLUMNS else 'number',
+            placeholder=f'{field} or {ENCODED_COLUMNS[field]}' if field in ENCODED_COLUMNS else f'{field}',
             style=input_style
-        ) for i, field in enumerate(fields)
+        ) for i, field in enumerate(FEATURES)
     ]
 
 # Enable/Disable Predict button
@@ -115,6 +187,29 @@ def toggle_predict_button(model_name):
     else:
         return True, {**predict_button_style, 'opacity': 0.5, 'cursor': 'not-allowed'}
 
+# Ensemble option only applies when comparing all models
+@callback(
+    Output('ensemble_options', 'style'),
+    Input('model_choice', 'value')
+)
+def toggle_ensemble_option(model_name):
+    return {'marginBottom': '20px'} if model_name == COMPARE_ALL else {'display': 'none'}
+
+
+def comparison_table(quantities, average):
+    # Side-by-side predictions of every model, plus their mean if asked for
+    rows = list(quantities.items())
+    if average and rows:
+        rows.append(("Ensemble (average)", sum(quantities.values()) / len(quantities)))
+    return dbc.Table([
+        html.Thead(html.Tr([html.Th("Model"), html.Th("Quantity"), html.Th("Restock")])),
+        html.Tbody([
+            html.Tr([html.Td(name), html.Td(f"{quantity:.2f}"),
+                     html.Td("Yes" if quantity > RESTOCK_THRESHOLD else "No")])
+            for name, quantity in rows
+        ]),
+    ], bordered=True, color="dark", size="sm", style={'fontSize': '16px'})
+
 # Make prediction
 @callback(
     Output('prediction_result', 'children'),
@@ -125,32 +220,25 @@ def toggle_predict_button(model_name):
     State('input_2', 'value'),  # Hour
     State('input_3', 'value'),  # DayOfWeek
     State('input_4', 'value'),  # CountryCode
+    State('ensemble_toggle', 'value'),
     prevent_initial_call=True
 )
-def make_prediction(n_clicks, model_name, f0, f1, f2, f3, f4):
-    if None in [f0, f1, f2, f3, f4]:
+def make_prediction(n_clicks, model_name, f0, f1, f2, f3, f4, ensemble=()):
+    if None in [f0, f1, f2, f3, f4] or '' in [f0, f4]:
         return "⚠️ Please fill in all fields."
 
     try:
-        # Features to be passed to the model
-        features = np.array([[f0, f1, f2, f3, f4]])
-
-        # Scale UnitPrice (index 1) and CountryCode (index 4)
-        # Ensure that you pass both features to the scaler as expected
-        scaled_vals = scaler.transform([[f1, f4]])[0]  # Transform UnitPrice and CountryCode
-        features[0][1] = scaled_vals[0]  # scaled UnitPrice
-        features[0][4] = scaled_vals[1]  # scaled CountryCode
-
-        # Make prediction
-        model = models[model_name]
-        prediction = model.predict(features)
-
-        # Multiply prediction by 3 and ensure it's positive
-        predicted_quantity = prediction[0] * 10
-        if predicted_quantity < 0:
-            predicted_quantity = abs(predicted_quantity)
-        
-        if predicted_quantity > 10:
+        f0 = resolve_code('ProductCode', f0)
+        f4 = resolve_code('CountryCode', f4)
+
+        # Every model on the same row, concurrently
+        if model_name == COMPARE_ALL:
+            return comparison_table(predict_all([f0, f1, f2, f3, f4]), 'average' in (ensemble or []))
+
+        # Same scoring path as batch uploads, with a single (cached) row
+        predicted_quantity = predict_one(model_name, [f0, f1, f2, f3, f4])
+
+        if predicted_quantity > RESTOCK_THRESHOLD:
             message = "Restock needed"
         else:
             message = "Does not need a Restock"
@@ -161,6 +249,101 @@ def make_prediction(n_clicks, model_name, f0, f1, f2, f3, f4):
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
+# Start a background job for an uploaded CSV or a retrain request
+@callback(
+    Output('job_id', 'data'),
+    Output('job_poll', 'disabled'),
+    Output('batch_result', 'children', allow_duplicate=True),
+    Input('batch_upload', 'contents'),
+    Input('retrain_btn', 'n_clicks'),
+    State('batch_upload', 'filename'),
+    State('model_choice', 'value'),
+    prevent_initial_call=True
+)
+def start_job(contents, retrain_clicks, filename, model_name):
+    if ctx.triggered_id == 'retrain_btn':
+        source = STORE_DIR if os.path.isdir(STORE_DIR) else DATASET_PATH
+        job_id = jobs.submit("retrain", jobs.retrain, source, 10, 5, jobs.RETRAIN_PROMOTE)
+        return job_id, False, "⏳ Retraining queued..."
+
+    if not model_name:
+        return None, True, "⚠️ Please choose a model first."
+    if model_name == COMPARE_ALL:
+        return None, True, "⚠️ Please choose a single model for batch scoring."
+
+    # Park the upload on disk; the job reads it in chunks
+    os.makedirs(jobs.JOB_DIR, exist_ok=True)
+    input_path = os.path.join(jobs.JOB_DIR, f"upload-{uuid.uuid4().hex}.csv")
+    _, encoded = contents.split(',', 1)
+    with open(input_path, 'wb') as f:
+        f.write(base64.b64decode(encoded))
+    job_id = jobs.submit("score", jobs.score_csv, model_name, input_path)
+    return job_id, False, f"⏳ Scoring {filename}..."
+
+# Report job progress while it runs
+@callback(
+    Output('batch_result', 'children'),
+    Output('job_progress', 'value'),
+    Output('job_progress', 'style'),
+    Output('job_poll', 'disabled', allow_duplicate=True),
+    Output('cancel_job_btn', 'style'),
+    Output('download_btn', 'style'),
+    Input('job_poll', 'n_intervals'),
+    State('job_id', 'data'),
+    prevent_initial_call=True
+)
+def poll_job(n_intervals, job_id):
+    hidden = {**predict_button_style, 'display': 'none'}
+    cancel_style = {**predict_button_style, 'backgroundColor': '#c0392b', 'marginRight': '10px'}
+    progress_style = {'marginTop': '20px'}
+    job = jobs.read_job(job_id) if job_id else None
+    if job is None:
+        return "", 0, {'display': 'none'}, True, {**hidden}, hidden
+
+    percent = 100 * job.get('progress', 0)
+    status = job['status']
+    if status in ('queued', 'running'):
+        return f"⏳ {job.get('message', '')}", percent, progress_style, False, cancel_style, hidden
+    if status == 'cancelled':
+        return "⚠️ Job cancelled.", percent, progress_style, True, hidden, hidden
+    if status == 'failed':
+        return f"❌ Error: {job.get('error')}", percent, progress_style, True, hidden, hidden
+
+    result = job.get('result') or {}
+    if job['kind'] == 'retrain':
+        if result.get('promoted'):
+            return f"✅ Models retrained ({result.get('version')}).", 100, progress_style, True, hidden, hidden
+        message = (f"✅ Models retrained into {result.get('version')}. "
+                   "Promote it with python -m utils.train --promote-version to serve it.")
+        return message, 100, progress_style, True, hidden, hidden
+    summary = f"✅ Scored {result.get('rows')} rows: {result.get('restock')} need a restock."
+    return summary, 100, progress_style, True, hidden, predict_button_style
+
+# Cancel the running job
+@callback(
+    Output('batch_result', 'children', allow_duplicate=True),
+    Input('cancel_job_btn', 'n_clicks'),
+    State('job_id', 'data'),
+    prevent_initial_call=True
+)
+def cancel_job(n_clicks, job_id):
+    if job_id:
+        jobs.cancel(job_id)
+    return "⏳ Cancelling..."
+
+# Download a finished scoring job's results
+@callback(
+    Output('batch_download', 'data'),
+    Input('download_btn', 'n_clicks'),
+    State('job_id', 'data'),
+    prevent_initial_call=True
+)
+def download_results(n_clicks, job_id):
+    job = jobs.read_job(job_id)
+    if job is None or job['kind'] != 'score' or job['status'] != 'done':
+        raise PreventUpdate
+    return dcc.send_file(jobs.result_path(job_id), filename="predictions.csv")
+
 
 
 # Register page
@@ -0,0 +1,87 @@
+# Plain Flask endpoints served next to the Dash app (registered in app.py)
+#
+#   POST /api/predict?model=Random%20Forest
+#
+# Body is either CSV (one row per product, with the five feature columns;
+# StockCode/Country text may be sent instead of ProductCode/CountryCode) or
+# JSON ({"model": ..., "rows": [{...}, ...]} or a bare list of rows). Rows are
+# scored in vectorized chunks and streamed back as CSV or JSON, matching the
+# request format.
+import io
+
+import pandas as pd
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from utils.model_registry import registry
+from utils.prediction_cache import prediction_cache
+from utils.scoring import FEATURES, prepare_frame, score_frame
+
+CHUNK_ROWS = 10_000
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+
+def _read_rows():
+    # -> (model name, DataFrame of rows, whether the caller sent JSON)
+    model_name = request.args.get("model")
+    if request.is_json:
+        payload = request.get_json()
+        if isinstance(payload, dict):
+            model_name = payload.get("model", model_name)
+            payload = payload.get("rows", [])
+        frame = pd.DataFrame(payload)
+        if not frame.empty and frame.columns.equals(pd.RangeIndex(len(FEATURES))):
+            frame.columns = FEATURES  # rows sent as plain lists
+        return model_name, frame, True
+
+    upload = request.files.get("file")
+    raw = upload.read() if upload else request.get_data()
+    return model_name, pd.read_csv(io.BytesIO(raw)), False
+
+
+def _stream(model_name, frame, as_json):
+    # frame has been through prepare_frame, so scoring cannot fail on its rows
+    # once the response has started
+    if as_json:
+        yield "["
+    elif frame.empty:
+        # Nothing to score: just the header of the scored CSV
+        yield pd.DataFrame(columns=list(frame.columns) + ["PredictedQuantity", "Restock"]).to_csv(index=False)
+    for start in range(0, len(frame), CHUNK_ROWS):
+        scored = score_frame(model_name, frame.iloc[start:start + CHUNK_ROWS])
+        if as_json:
+            body = scored.to_json(orient="records")[1:-1]
+            yield ("," if start and body else "") + body
+        else:
+            yield scored.to_csv(index=False, header=start == 0)
+    if as_json:
+        yield "]"
+
+
+@api.route("/predict", methods=["POST"])
+def predict():
+    try:
+        model_name, frame, as_json = _read_rows()
+    except (ValueError, pd.errors.ParserError) as e:
+        return jsonify(error=f"Could not parse rows: {e}"), 400
+
+    if model_name not in registry.available():
+        return jsonify(error=f"Unknown model {model_name!r}", models=registry.available()), 400
+    # Unknown StockCode/Country values, missing columns and non-numeric
+    # values are client errors, reported before anything is streamed. An
+    # empty batch (even one without columns) gets an empty result.
+    if frame.empty:
+        frame = pd.DataFrame(columns=FEATURES)
+    try:
+        frame = prepare_frame(frame)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    mimetype = "application/json" if as_json else "text/csv"
+    return Response(stream_with_context(_stream(model_name, frame, as_json)), mimetype=mimetype)
+
+
+@api.route("/models", methods=["GET"])
+def list_models():
+    return jsonify(models=registry.available(), features=FEATURES, loaded=registry.stats(),
+                   prediction_cache=prediction_cache.stats())
@@ -0,0 +1,291 @@
+# Shared, read-only access to the retail dataset.
+#
+# The workbook is converted once into a columnar cache (one .npy file per
+# column) which every page and every gunicorn worker memory-maps, so the
+# openpyxl parse only happens when the source file actually changes.
+#
+# Columns are stored in the compact types of SCHEMA: 32-bit numbers, text as
+# dictionary-encoded categories (int8/int16/int32 codes into one shared list
+# of strings) and real datetimes, so a worker can hold the full history.
+#
+#   python -m utils.data_store          # per-column memory footprint
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import metrics
+
+DATASET_PATH = os.environ.get("DATASET_PATH", "DataSet.xlsx")
+CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", os.path.join(".cache", "dataset"))
+
+SOURCE_FILE = "source.json"
+MANIFEST_FILE = "manifest.json"
+CACHE_VERSION = 2  # bump when SCHEMA or the column format changes
+
+# Compact type per column. Integer columns with missing values fall back to
+# float32 (exact for ids below 2**24), values out of range keep 64 bits.
+# Columns not listed keep their parsed type, text becomes a category.
+SCHEMA = {
+    "InvoiceNo": "category",
+    "StockCode": "category",
+    "Description": "category",
+    "Quantity": "int32",
+    "InvoiceDate": "datetime64[ns]",
+    "UnitPrice": "float32",
+    "CustomerID": "int32",
+    "Country": "category",
+}
+
+_lock = threading.Lock()
+_loaded = {}  # sha256 -> DataFrame, one per process
+_sort_orders = {}  # (sha256, column, ascending) -> row order
+
+
+def file_sha256(*paths):
+    # Hex SHA-256 of the files' contents, read in 1 MB blocks (one file, or
+    # several hashed one after another)
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, payload):
+    # Write next to the target and swap in, so readers never see half a file
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _compact_integers(series, dtype):
+    values = pd.to_numeric(series, errors="coerce")
+    info = np.iinfo(dtype)
+    present = values.dropna()
+    if len(present) and (present.min() < info.min or present.max() > info.max or (present % 1 != 0).any()):
+        return values
+    if len(present) < len(values):
+        return values.astype(np.float32) if present.abs().max() < 2 ** 24 else values.astype(np.float64)
+    return values.astype(dtype)
+
+
+def apply_schema(frame, schema=SCHEMA):
+    # The parsed source converted to the compact types of the schema
+    columns = {}
+    for name in frame.columns:
+        series, kind = frame[name], schema.get(name)
+        if kind == "category":
+            # Mixed cells (e.g. numeric and text stock codes) all become text
+            series = series.where(series.isna(), series.astype(str)).astype("category")
+        elif kind is not None and kind.startswith("datetime64"):
+            series = pd.to_datetime(series, errors="coerce").astype(kind)
+        elif kind is not None and kind.startswith("int"):
+            series = _compact_integers(series, kind)
+        elif kind is not None:
+            series = pd.to_numeric(series, errors="coerce").astype(kind)
+        columns[name] = series
+    return pd.DataFrame(columns)
+
+
+def _code_type(n_categories):
+    for dtype in (np.int8, np.int16):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int32
+
+
+def read_source(path=DATASET_PATH):
+    # Parse the raw source file (Excel workbook or CSV)
+    if path.lower().endswith(".csv"):
+        with metrics.timer("dataset_parse_seconds", format="csv"):
+            return pd.read_csv(path)
+    with metrics.timer("dataset_parse_seconds", format="excel"):
+        return pd.read_excel(path)
+
+
+def fingerprint(path=DATASET_PATH, cache_dir=CACHE_DIR):
+    # Content hash of the source file. The stat() result is remembered in the
+    # cache directory so the file is only re-hashed when its mtime/size move.
+    stat = os.stat(path)
+    source_path = os.path.join(cache_dir, SOURCE_FILE)
+    known = _read_json(source_path) or {}
+    if (known.get("path") == os.path.abspath(path)
+            and known.get("size") == stat.st_size
+            and known.get("mtime_ns") == stat.st_mtime_ns):
+        return known["sha256"]
+
+    sha = file_sha256(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_json(source_path, {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha,
+    })
+    return sha
+
+
+def write_columns(frame, directory):
+    # Store every column as its own .npy file. Text columns are dictionary
+    # encoded (the smallest int codes that fit + a JSON list of categories) so
+    # they can be mapped too.
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for i, name in enumerate(frame.columns):
+        series = frame[name]
+        entry = {"name": str(name), "file": f"col_{i}.npy"}
+        if (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+                or pd.api.types.is_datetime64_any_dtype(series)) \
+                and not isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, entry["file"]), series.to_numpy())
+            entry["kind"] = "array"
+        else:
+            try:
+                codes, categories = pd.factorize(series, sort=True)
+            except TypeError:  # mixed types that cannot be ordered
+                codes, categories = pd.factorize(series)
+            np.save(os.path.join(directory, entry["file"]), codes.astype(_code_type(len(categories))))
+            entry["kind"] = "category"
+            entry["categories"] = [c.item() if isinstance(c, np.generic) else c for c in categories]
+        columns.append(entry)
+    _write_json(os.path.join(directory, MANIFEST_FILE), {"rows": len(frame), "columns": columns})
+
+
+def read_columns(directory, columns=None):
+    # Open a directory written by write_columns() as a DataFrame backed by
+    # read-only memory maps (no copy of the numeric data is made)
+    manifest = _read_json(os.path.join(directory, MANIFEST_FILE))
+    if manifest is None:
+        raise FileNotFoundError(f"No columnar data in {directory}")
+
+    data = {}
+    for entry in manifest["columns"]:
+        if columns is not None and entry["name"] not in columns:
+            continue
+        values = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+        if entry["kind"] == "category":
+            values = pd.Categorical.from_codes(values, categories=entry["categories"])
+        data[entry["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _version_dir(cache_dir, sha):
+    return os.path.join(cache_dir, f"{sha}-v{CACHE_VERSION}")
+
+
+def build_cache(path=DATASET_PATH, cache_dir=CACHE_DIR):
+    # Convert the source into the columnar cache if this version of the file
+    # has not been converted yet. Returns the directory holding the columns.
+    sha = fingerprint(path, cache_dir)
+    target = _version_dir(cache_dir, sha)
+    if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+        return target
+
+    # Build privately, then rename into place. If another worker won the race
+    # the rename fails and its copy is used instead.
+    staging = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+    write_columns(apply_schema(read_source(path)), staging)
+    try:
+        os.rename(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # Old versions are dropped best-effort; platforms that refuse to delete
+    # mapped files simply keep them until the next rebuild.
+    for name in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, name)
+        if stale != target and os.path.isdir(stale) and ".tmp-" not in name:
+            shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+
+def load_dataset(path=DATASET_PATH, cache_dir=CACHE_DIR):
+    # Memory-mapped view of the dataset, shared by every page in this process.
+    # Treat it as read-only: select/copy before modifying.
+    sha = fingerprint(path, cache_dir)
+    with _lock:
+        if sha not in _loaded:
+            _loaded.clear()
+            _sort_orders.clear()
+            _loaded[sha] = read_columns(build_cache(path, cache_dir))
+        return _loaded[sha]
+
+
+def sort_order(column, ascending=True, path=DATASET_PATH, cache_dir=CACHE_DIR):
+    # Row positions of the dataset sorted by one column (stable, missing
+    # values last). Computed once per dataset version, stored next to the
+    # column files and memory-mapped like them.
+    frame = load_dataset(path, cache_dir)
+    sha = fingerprint(path, cache_dir)
+    key = (sha, column, ascending)
+    with _lock:
+        if key in _sort_orders:
+            return _sort_orders[key]
+
+    position = list(frame.columns).index(column)
+    order_path = os.path.join(_version_dir(cache_dir, sha), f"sort_{position}_{'asc' if ascending else 'desc'}.npy")
+    if not os.path.exists(order_path):
+        order = frame[column].reset_index(drop=True).sort_values(
+            ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        tmp_path = f"{order_path}.tmp-{os.getpid()}-{threading.get_ident()}.npy"
+        np.save(tmp_path, order.astype(np.int64))
+        os.replace(tmp_path, order_path)
+
+    order = np.load(order_path, mmap_mode="r")
+    with _lock:
+        _sort_orders[key] = order
+    return order
+
+
+def memory_report(frame):
+    # Bytes held per column, next to what pandas' default types (64-bit
+    # numbers, one Python string object per text cell) would take
+    rows = []
+    for name in frame.columns:
+        series = frame[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            categories = series.cat.categories
+            held = codes.nbytes + int(categories.memory_usage(deep=True))
+            counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+            sizes = np.array([sys.getsizeof(c) for c in categories], dtype=np.int64)
+            default = 8 * len(series) + int(counts @ sizes)
+        else:
+            held = int(series.memory_usage(index=False, deep=True))
+            default = 8 * len(series)
+        rows.append({"column": name, "dtype": str(series.dtype), "bytes": held, "default_bytes": default})
+
+    report = pd.DataFrame(rows)
+    total = {"column": "total", "dtype": "", "bytes": report["bytes"].sum(),
+             "default_bytes": report["default_bytes"].sum()}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report["reduction"] = (report["default_bytes"] / report["bytes"].clip(lower=1)).round(1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-column memory footprint of the loaded dataset")
+    parser.add_argument("--source", default=DATASET_PATH, help="workbook or CSV (default: %(default)s)")
+    args = parser.parse_args(argv)
+    print(memory_report(load_dataset(args.source)).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
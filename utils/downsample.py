@@ -0,0 +1,62 @@
+# Bounded scatter charts for any number of points.
+#
+# thin() keeps at most max_points of the points inside a viewport by laying a
+# grid over it and keeping one point per occupied cell: dense areas are
+# thinned, sparse areas and outliers stay, and the shape of the cloud is
+# preserved. Charts call it again with the zoomed axis ranges (from the
+# graph's relayoutData), so detail comes back as the user zooms in while the
+# payload stays the same size. Traces switch to WebGL (Scattergl) above
+# WEBGL_THRESHOLD points.
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+WEBGL_THRESHOLD = int(os.environ.get("WEBGL_THRESHOLD", "1000"))
+MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "2000"))  # per trace
+
+
+def thin(x, y, max_points=MAX_POINTS, x_range=None, y_range=None):
+    # Indices of at most max_points points of (x, y) inside the ranges
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    inside = np.isfinite(x) & np.isfinite(y)
+    if x_range is not None:
+        inside &= (x >= x_range[0]) & (x <= x_range[1])
+    if y_range is not None:
+        inside &= (y >= y_range[0]) & (y <= y_range[1])
+    index = np.flatnonzero(inside)
+    if len(index) <= max_points:
+        return index
+
+    # One point per cell of a side x side grid over the visible points
+    side = max(1, int(np.sqrt(max_points)))
+    cells = np.zeros(len(index), dtype=np.int64)
+    for values in (x[index], y[index]):
+        low, high = values.min(), values.max()
+        scale = side / (high - low) if high > low else 0.0
+        cells = cells * side + np.minimum(((values - low) * scale).astype(np.int64), side - 1)
+    _, first = np.unique(cells, return_index=True)
+    return index[np.sort(first)]
+
+
+def scatter_trace(x, y, **kwargs):
+    # go.Scatter, or go.Scattergl once the trace has many points
+    trace = go.Scattergl if len(x) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def zoom_ranges(relayout, previous=(None, None)):
+    # (x_range, y_range) after a dcc.Graph relayoutData event; axes the event
+    # does not mention keep their previous range, None means autoranged
+    relayout = relayout or {}
+    ranges = []
+    for axis, old in zip(("xaxis", "yaxis"), previous):
+        if relayout.get(f"{axis}.autorange"):
+            ranges.append(None)
+        elif f"{axis}.range[0]" in relayout:
+            ranges.append([float(relayout[f"{axis}.range[0]"]), float(relayout[f"{axis}.range[1]"])])
+        elif f"{axis}.range" in relayout:
+            ranges.append([float(v) for v in relayout[f"{axis}.range"]])
+        else:
+            ranges.append(old)
+    return ranges
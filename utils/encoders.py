@@ -0,0 +1,126 @@
+# Stable integer codes for StockCode (ProductCode) and Country (CountryCode).
+#
+# The notebook's .astype('category').cat.codes depends on which rows are
+# loaded; these encoders are saved in artifacts/encoders.json instead. A
+# value keeps its code forever and new values are appended at the end, so
+# history never has to be re-encoded. Lookups go through a dict (single
+# values) or a hashed pandas Index (whole columns).
+#
+#   python -m utils.encoders DataSet.xlsx     # seed/extend from a dataset
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+ENCODERS_PATH = os.path.join(os.environ.get("ARTIFACTS_DIR", "artifacts"), "encoders.json")
+
+# Code column -> source text column
+ENCODED_COLUMNS = {"ProductCode": "StockCode", "CountryCode": "Country"}
+
+
+def _normalize(values):
+    # Excel gives StockCode as a mix of ints and strings; codes are keyed on text
+    return pd.Series(values, dtype=object).astype(str).str.strip()
+
+
+class CategoryEncoder:
+    def __init__(self, categories=()):
+        self.categories = []
+        self.mapping = {}
+        self._index = None
+        self._lock = threading.Lock()
+        self.add(categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def add(self, values):
+        # Append values not seen before; returns how many were new
+        new = [v for v in pd.unique(_normalize(values)) if v not in self.mapping]
+        with self._lock:
+            for value in new:
+                if value not in self.mapping:
+                    self.mapping[value] = len(self.categories)
+                    self.categories.append(value)
+            if new:
+                self._index = None
+        return len(new)
+
+    def code(self, value, default=None):
+        # Code of a single value (O(1) dict lookup)
+        return self.mapping.get(str(value).strip(), default)
+
+    def encode(self, values, grow=False):
+        # int32 codes for a whole column; unknown values become -1 unless grow=True
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            # Categorical columns (the dataset cache's) are encoded per category, not per row
+            values = values.cat.remove_unused_categories()
+            codes = self.encode(values.cat.categories, grow)
+            rows = values.cat.codes.to_numpy()
+            return np.where(rows < 0, -1, codes[rows]).astype(np.int32)
+        values = _normalize(values)
+        if grow:
+            self.add(values)
+        index = self._index
+        if index is None:
+            index = self._index = pd.Index(self.categories, dtype=object)
+        return index.get_indexer(values).astype(np.int32)
+
+    def decode(self, codes):
+        return np.asarray(self.categories, dtype=object)[np.asarray(codes)]
+
+
+def load_encoders(path=ENCODERS_PATH):
+    # {"ProductCode": CategoryEncoder, "CountryCode": CategoryEncoder}
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        payload = {}
+    return {name: CategoryEncoder(payload.get(name, {}).get("categories", []))
+            for name in ENCODED_COLUMNS}
+
+
+def save_encoders(encoders, path=ENCODERS_PATH):
+    payload = {
+        name: {"source": ENCODED_COLUMNS[name], "categories": encoder.categories}
+        for name, encoder in encoders.items()
+    }
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+_shared = {}
+
+
+def encoders():
+    # Encoders shared by the app, reloaded when the artifact file changes
+    try:
+        version = os.stat(ENCODERS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        version = None
+    if _shared.get("version") != version or "encoders" not in _shared:
+        _shared["encoders"] = load_encoders()
+        _shared["version"] = version
+    return _shared["encoders"]
+
+
+if __name__ == "__main__":
+    from utils.data_store import read_source
+
+    parser = argparse.ArgumentParser(description="Seed or extend artifacts/encoders.json from a dataset")
+    parser.add_argument("source", help=".xlsx or .csv with StockCode and Country columns")
+    args = parser.parse_args()
+
+    current = load_encoders()
+    frame = read_source(args.source)
+    for name, column in ENCODED_COLUMNS.items():
+        # New values are added in sorted order, like .cat.codes would number them
+        added = current[name].add(sorted(_normalize(frame[column].dropna()).unique()))
+        print(f"{name}: {added} new, {len(current[name])} total")
+    save_encoders(current)
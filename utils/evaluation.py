@@ -0,0 +1,277 @@
+# Evaluation snapshot of the current artifacts: the notebook's metric table,
+# restock decision counts and a sample of predicted vs actual quantities for
+# every model, on the dataset with the training split (80/20, seed 42).
+#
+#   python -m utils.evaluation          # refresh artifacts/evaluation.json
+#
+# The full held-out predictions of every model are kept next to it in
+# <snapshot>_predictions.npz for charts that zoom into them (the snapshot
+# itself holds a fixed sample). Models are evaluated as served, through the
+# model in their inference pipeline. Pages only ever read the stored
+# snapshot. refresh() re-evaluates just the models whose artifact or
+# pipeline, the scaler or the dataset changed (compared by
+# content hash, so a fresh clone of a committed snapshot stays valid). It
+# runs from the command line, after training promotes a version, and in a
+# background thread when the app starts. utils.train (and with it sklearn)
+# is only imported by the functions that evaluate, so pages reading the
+# snapshot don't pay for it at startup.
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.data_store import DATASET_PATH, file_sha256, fingerprint
+from utils.forest_inference import fast_predict
+from utils.model_registry import ARTIFACTS_DIR, SCALER_FILE, pipeline_file, registry
+from utils.scoring import FEATURES, RESTOCK_THRESHOLD
+
+SNAPSHOT_PATH = os.environ.get("EVALUATION_PATH", os.path.join(ARTIFACTS_DIR, "evaluation.json"))
+LOCK_PATH = os.path.join(".cache", "evaluation.lock")
+LOCK_TIMEOUT = 3600  # seconds after which a leftover lock file is ignored
+SAMPLE_POINTS = 300
+SEED = 42
+
+_lock = threading.Lock()
+_loaded = {}  # "mtime" and "snapshot" of the last file read
+_loaded_predictions = {}  # "mtime" and "arrays" of the last predictions file read
+
+
+def predictions_path(path=SNAPSHOT_PATH):
+    return f"{os.path.splitext(path)[0]}_predictions.npz"
+
+
+def _file_hashes(filenames, known):
+    # {file: {size, mtime_ns, sha256}}; files whose stat() matches the previous
+    # snapshot keep their hash instead of being read again
+    hashes = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(ARTIFACTS_DIR, filename))
+        entry = known.get(filename, {})
+        if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                     "sha256": file_sha256(os.path.join(ARTIFACTS_DIR, filename))}
+        hashes[filename] = entry
+    return hashes
+
+
+def _current_state(previous):
+    # -> (file hashes, data fingerprint, {model: key}) for the artifacts on disk
+    from utils.train import MODEL_FILES
+
+    models = {name: filename for name, filename in MODEL_FILES.items()
+              if os.path.exists(os.path.join(ARTIFACTS_DIR, filename))
+              and os.path.exists(os.path.join(ARTIFACTS_DIR, pipeline_file(filename)))}
+    pipelines = {pipeline_file(filename) for filename in models.values()}
+    files = _file_hashes(sorted(set(models.values()) | pipelines | {SCALER_FILE}), previous.get("files", {}))
+    data = fingerprint(DATASET_PATH)
+    keys = {name: "/".join([files[filename]["sha256"][:16], files[pipeline_file(filename)]["sha256"][:16],
+                            files[SCALER_FILE]["sha256"][:16], data[:16]])
+            for name, filename in models.items()}
+    return files, data, keys
+
+
+def _held_out(scaler):
+    # The training split of the dataset, standardized with the artifact scaler
+    from sklearn.model_selection import train_test_split
+    from utils.train import TARGET, load_training_frame
+
+    frame = load_training_frame(DATASET_PATH, save_codes=False)  # runs in the app: read-only
+    frame[['UnitPrice', 'Quantity']] = scaler.transform(frame[['UnitPrice', 'Quantity']])
+    return train_test_split(frame[FEATURES], frame[TARGET], test_size=0.2, random_state=SEED)
+
+
+def _cv_scores(files):
+    # CV R² from the promoted training manifest, if it describes these files
+    try:
+        with open(os.path.join(ARTIFACTS_DIR, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    scores = {}
+    for name, entry in manifest.get("models", {}).items():
+        filename = entry.get("file")
+        if filename in files and manifest.get("files", {}).get(filename) == files[filename]["sha256"]:
+            scores[name] = (entry.get("cv_r2_mean"), entry.get("cv_r2_std"))
+    return scores
+
+
+def evaluate_model(model, scaler, X_train, X_test, y_train, y_test):
+    # (metric table, restock confusion counts and a prediction sample;
+    # actual and predicted test quantities), from one vectorized predict over
+    # train and test rows together
+    from utils.train import inverse_transform_quantity, score_predictions
+
+    X = np.vstack([X_train.to_numpy(dtype=float), X_test.to_numpy(dtype=float)])
+    predictions = fast_predict(model, X)
+    pred_train, pred_test = predictions[:len(X_train)], predictions[len(X_train):]
+    metrics = score_predictions(scaler, y_train, y_test, pred_train, pred_test)
+
+    actual = inverse_transform_quantity(scaler, y_test)
+    predicted = inverse_transform_quantity(scaler, pred_test)
+    needs, flagged = actual > RESTOCK_THRESHOLD, predicted > RESTOCK_THRESHOLD
+    restock = {
+        "tp": int(np.sum(needs & flagged)), "fp": int(np.sum(~needs & flagged)),
+        "fn": int(np.sum(needs & ~flagged)), "tn": int(np.sum(~needs & ~flagged)),
+    }
+    restock["precision"] = restock["tp"] / (restock["tp"] + restock["fp"]) if restock["tp"] + restock["fp"] else None
+    restock["recall"] = restock["tp"] / (restock["tp"] + restock["fn"]) if restock["tp"] + restock["fn"] else None
+
+    sample = np.arange(len(actual))
+    if len(sample) > SAMPLE_POINTS:
+        sample = np.sort(np.random.default_rng(SEED).choice(sample, SAMPLE_POINTS, replace=False))
+    return {
+        "metrics": metrics,
+        "restock": restock,
+        "sample": {"actual": np.round(actual[sample], 3).tolist(),
+                   "predicted": np.round(predicted[sample], 3).tolist()},
+    }, actual, predicted
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    # The stored snapshot (None if there is none yet), re-read when the file changes
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _loaded.get("mtime") != mtime:
+        with open(path, encoding="utf-8") as f:
+            _loaded["snapshot"] = json.load(f)
+        _loaded["mtime"] = mtime
+    return _loaded["snapshot"]
+
+
+def load_predictions(path=SNAPSHOT_PATH):
+    # {"actual": array, <model>: predicted array} of the held-out rows (None
+    # if there is no predictions file), re-read when the file changes
+    try:
+        mtime = os.stat(predictions_path(path)).st_mtime_ns
+    except OSError:
+        return None
+    if _loaded_predictions.get("mtime") != mtime:
+        with np.load(predictions_path(path)) as arrays:
+            _loaded_predictions["arrays"] = {name: arrays[name] for name in arrays.files}
+        _loaded_predictions["mtime"] = mtime
+    return _loaded_predictions["arrays"]
+
+
+def is_stale(path=SNAPSHOT_PATH):
+    snapshot = load_snapshot(path) or {}
+    _, _, keys = _current_state(snapshot)
+    known = snapshot.get("models", {})
+    predictions = load_predictions(path) or {}
+    return set(keys) != set(known) or any(known[name]["key"] != key or name not in predictions
+                                          for name, key in keys.items())
+
+
+def _acquire_file_lock():
+    # One refresh at a time across worker processes
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(LOCK_PATH) > LOCK_TIMEOUT:
+            os.remove(LOCK_PATH)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def refresh(path=SNAPSHOT_PATH, log=lambda message: None):
+    # Bring the snapshot up to date; returns it (or None if another process
+    # is already refreshing)
+    from utils.train import MODEL_FILES
+
+    with _lock:
+        if not _acquire_file_lock():
+            log("Another process is refreshing the evaluation snapshot")
+            return None
+        try:
+            previous = load_snapshot(path) or {}
+            files, data, keys = _current_state(previous)
+            known = previous.get("models", {})
+            predictions = dict(load_predictions(path) or {})
+            stale = [name for name, key in keys.items()
+                     if known.get(name, {}).get("key") != key or name not in predictions]
+            if not stale and set(known) == set(keys):
+                log("Evaluation snapshot is up to date")
+                return previous
+
+            models = {name: known[name] for name in keys if name not in stale}
+            split_rows = previous.get("rows")
+            if stale:
+                scaler = registry.get(SCALER_FILE)
+                X_train, X_test, y_train, y_test = _held_out(scaler)
+                split_rows = {"train": len(X_train), "test": len(X_test)}
+                cv = _cv_scores(files)
+                for name in stale:
+                    start = time.perf_counter()
+                    # The model as served (its pipeline's), so the registry holds one copy of it
+                    model = registry.get(pipeline_file(MODEL_FILES[name])).model
+                    result, predictions["actual"], predictions[name] = evaluate_model(
+                        model, scaler, X_train, X_test, y_train, y_test)
+                    mean, std = cv.get(name, (None, None))
+                    result["metrics"]["CV R² (Mean)"] = mean
+                    result["metrics"]["CV R² (Std)"] = std
+                    models[name] = {"file": MODEL_FILES[name], "key": keys[name], **result}
+                    log(f"Evaluated {name} in {time.perf_counter() - start:.2f}s")
+
+            snapshot = {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "data_fingerprint": data,
+                "rows": split_rows,
+                "restock_threshold": RESTOCK_THRESHOLD,
+                "files": files,
+                "models": {name: models[name] for name in MODEL_FILES if name in models},
+            }
+            # Predictions first, so a snapshot never points at older ones
+            arrays = {name: predictions[name] for name in ["actual", *snapshot["models"]] if name in predictions}
+            tmp_path = f"{os.path.splitext(path)[0]}.tmp-{os.getpid()}-{threading.get_ident()}.npz"
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, predictions_path(path))
+
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=1)
+            os.replace(tmp_path, path)
+            return snapshot
+        finally:
+            os.remove(LOCK_PATH)
+
+
+def refresh_in_background():
+    # Called at app start; never blocks the server (set EVALUATE_ON_START=0 to skip)
+    if os.environ.get("EVALUATE_ON_START", "1") == "0":
+        return
+
+    def run():
+        try:
+            if is_stale():
+                refresh(log=print)
+        except Exception as e:
+            print(f"Evaluation snapshot refresh failed: {e}")
+
+    threading.Thread(target=run, name="evaluation-refresh", daemon=True).start()
+
+
+def metric_rows(snapshot):
+    # Rows for the metric tables: {"Model": name, <metric>: value, ...}
+    if not snapshot:
+        return []
+    return [{"Model": name, **{k: None if v is None else round(v, 6) for k, v in entry["metrics"].items()}}
+            for name, entry in snapshot["models"].items()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the evaluation snapshot of the current artifacts")
+    parser.add_argument("--out", default=SNAPSHOT_PATH, help="snapshot file (default: %(default)s)")
+    args = parser.parse_args(argv)
+    refresh(args.out, log=print)
+
+
+if __name__ == "__main__":
+    main()
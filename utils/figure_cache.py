@@ -0,0 +1,92 @@
+# Precomputed figures for the Analysis page.
+#
+# Figures are built from summary statistics rather than raw rows (box plots
+# get quartiles, whiskers and a capped sample of outliers), serialized to
+# plotly JSON once per dataset fingerprint and stored under .cache/figures.
+# Pages hand the stored dicts straight to dcc.Graph.
+import json
+import os
+import threading
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.metrics import metrics
+
+FIGURE_DIR = os.environ.get("FIGURE_CACHE_DIR", os.path.join(".cache", "figures"))
+FIGURE_VERSION = 2  # bump when the figure builders below (or the dataset types) change
+MAX_OUTLIERS = 200
+
+_lock = threading.Lock()
+_memory = {}  # (fingerprint, name) -> figure dict
+
+
+def cached_figure(name, fingerprint, build):
+    # Figure dict for (name, fingerprint); build() -> go.Figure is only called on a miss
+    key = (fingerprint, name)
+    with _lock:
+        if key in _memory:
+            metrics.inc("figure_cache_requests_total", figure=name, result="memory")
+            return _memory[key]
+
+    directory = os.path.join(FIGURE_DIR, f"{fingerprint}-v{FIGURE_VERSION}")
+    path = os.path.join(directory, f"{name}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            figure = json.load(f)
+        metrics.inc("figure_cache_requests_total", figure=name, result="disk")
+    except (OSError, ValueError):
+        metrics.inc("figure_cache_requests_total", figure=name, result="build")
+        with metrics.timer("figure_build_seconds", figure=name):
+            built = build()
+        with metrics.timer("figure_serialize_seconds", figure=name):
+            text = built.to_json()
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        figure = json.loads(text)
+
+    with _lock:
+        _memory[key] = figure
+    return figure
+
+
+def box_summary(values, max_outliers=MAX_OUTLIERS, seed=42):
+    # Tukey box statistics (same linear quartiles as plotly) plus an outlier sample
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    if len(outliers) > max_outliers:
+        outliers = np.random.default_rng(seed).choice(outliers, max_outliers, replace=False)
+    return {
+        "q1": q1, "median": median, "q3": q3,
+        "lowerfence": inside.min(), "upperfence": inside.max(),
+        "outliers": outliers, "count": len(values),
+    }
+
+
+def box_figure(values, name, title):
+    stats = box_summary(values)
+    fig = go.Figure([
+        go.Box(x=[name], q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+               lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]],
+               name=name, boxpoints=False, showlegend=False),
+        go.Scatter(x=[name] * len(stats["outliers"]), y=stats["outliers"], mode="markers",
+                   name="outliers", showlegend=False, marker=dict(size=4)),
+    ])
+    fig.update_layout(template="plotly_dark", title=title, yaxis_title=name)
+    return fig
+
+
+def correlation_figure(frame):
+    return px.imshow(frame.corr(),
+                     text_auto=True,
+                     color_continuous_scale='Blues',
+                     template="plotly_dark",
+                     title="Correlation Matrix")
@@ -0,0 +1,173 @@
+# Compact export of the Random Forest for serving.
+#
+#   python -m utils.forest_export
+#   python -m utils.forest_export --max-depth 12 --min-node-samples 5 --pipeline --report forest.json
+#
+# The fitted forest is flattened into the node tables of utils.forest_inference
+# with float32 thresholds and values and the narrowest integer types, can be
+# pruned (splits below --max-depth, or of nodes with fewer than
+# --min-node-samples training rows, become leaves predicting the node's mean)
+# and is stored with joblib compression. The result is a FlatForest that
+# fast_predict() evaluates directly; --pipeline also rewrites the forest's
+# inference pipeline (utils/pipeline.py) to serve it. The export prints a
+# report of sizes, load times and prediction differences from the original
+# estimator on the dataset's rows.
+import argparse
+import json
+import os
+import statistics
+import time
+
+import joblib
+import numpy as np
+
+from utils.data_store import DATASET_PATH
+from utils.forest_inference import FlatForest
+from utils.model_registry import ARTIFACTS_DIR, SCALER_FILE
+from utils.scoring import FEATURES, RESTOCK_THRESHOLD
+
+FOREST_FILE = "Random_Forest.pkl"
+COMPACT_FILE = "Random_Forest_compact.pkl"
+COMPRESS = 3  # joblib zlib level
+LOAD_REPEATS = 5
+
+
+def prune_tree(tree, max_depth=None, min_node_samples=None):
+    # (children_left, children_right, feature, threshold, missing_go_to_left,
+    # value) of a fitted sklearn tree without the pruned splits, renumbered
+    left, right = tree.children_left, tree.children_right
+    leaf = left == -1
+    if min_node_samples:
+        leaf = leaf | (tree.n_node_samples < min_node_samples)
+
+    # Walk down level by level, stopping at leaves and at max_depth
+    keep = np.zeros(tree.node_count, dtype=bool)
+    frontier, depth = np.array([0]), 0
+    while len(frontier):
+        keep[frontier] = True
+        if max_depth is not None and depth >= max_depth:
+            leaf[frontier] = True
+        frontier = frontier[~leaf[frontier]]
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        depth += 1
+
+    kept = np.flatnonzero(keep)
+    new_id = np.full(tree.node_count, -1)
+    new_id[kept] = np.arange(len(kept))
+    is_leaf = leaf[kept]
+    return (
+        np.where(is_leaf, -1, new_id[left[kept]]),
+        np.where(is_leaf, -1, new_id[right[kept]]),
+        np.where(is_leaf, -2, tree.feature[kept]),
+        np.where(is_leaf, -2.0, tree.threshold[kept]),
+        tree.missing_go_to_left[kept],
+        tree.value[kept, 0, 0],
+    )
+
+
+def compact_forest(forest, max_depth=None, min_node_samples=None):
+    if forest.n_outputs_ != 1:
+        raise ValueError("Only single-output forests are supported")
+    trees = [prune_tree(estimator.tree_, max_depth, min_node_samples) for estimator in forest.estimators_]
+    return FlatForest.from_trees(trees, compact=True)
+
+
+def _load_seconds(path):
+    timings = []
+    for _ in range(LOAD_REPEATS):
+        start = time.perf_counter()
+        joblib.load(path)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _rows(scaler):
+    # Model inputs and standardized targets for every row of the dataset
+    from utils.train import TARGET, load_training_frame
+
+    frame = load_training_frame(DATASET_PATH, save_codes=False)
+    frame[['UnitPrice', 'Quantity']] = scaler.transform(frame[['UnitPrice', 'Quantity']])
+    return frame[FEATURES].to_numpy(dtype=float), frame[TARGET].to_numpy(dtype=float)
+
+
+def report(forest, flat, forest_path, compact_path, scaler):
+    # Size, load time and prediction differences of the export vs the original
+    from sklearn.metrics import r2_score
+
+    X, y = _rows(scaler)
+    original, compact = forest.predict(X), flat.predict(X)
+    units = scaler.scale_[1]
+    original_units, compact_units = original * units + scaler.mean_[1], compact * units + scaler.mean_[1]
+    exact = FlatForest.from_sklearn(forest)
+    return {
+        "original": {
+            "file_bytes": os.path.getsize(forest_path),
+            "table_bytes": exact.nbytes(),
+            "nodes": len(exact.value),
+            "max_depth": exact.max_depth,
+            "load_seconds": _load_seconds(forest_path),
+            "r2": float(r2_score(y, original)),
+        },
+        "compact": {
+            "file_bytes": os.path.getsize(compact_path),
+            "table_bytes": flat.nbytes(),
+            "nodes": len(flat.value),
+            "max_depth": flat.max_depth,
+            "load_seconds": _load_seconds(compact_path),
+            "r2": float(r2_score(y, compact)),
+        },
+        "rows": len(X),
+        "max_abs_delta_units": float(np.max(np.abs(compact_units - original_units))),
+        "mean_abs_delta_units": float(np.mean(np.abs(compact_units - original_units))),
+        "restock_flips": int(np.sum((compact_units > RESTOCK_THRESHOLD) != (original_units > RESTOCK_THRESHOLD))),
+    }
+
+
+def print_report(result):
+    original, compact = result["original"], result["compact"]
+    for key in ("file_bytes", "table_bytes", "nodes", "max_depth", "load_seconds", "r2"):
+        ratio = f"  ({compact[key] / original[key]:.2f}x)" if original[key] and key != "r2" else ""
+        print(f"{key:14s} {original[key]:>14.6g} -> {compact[key]:<14.6g}{ratio}")
+    print(f"Prediction delta on {result['rows']} rows: max {result['max_abs_delta_units']:.6g}, "
+          f"mean {result['mean_abs_delta_units']:.6g} units; {result['restock_flips']} restock decisions changed")
+
+
+def export(artifacts_dir=ARTIFACTS_DIR, out=None, max_depth=None, min_node_samples=None,
+           compress=COMPRESS, pipeline=False):
+    # Write the compact forest (and optionally its pipeline); returns the report
+    forest_path = os.path.join(artifacts_dir, FOREST_FILE)
+    out = out or os.path.join(artifacts_dir, COMPACT_FILE)
+    forest = joblib.load(forest_path)
+    flat = compact_forest(forest, max_depth, min_node_samples)
+
+    tmp_path = f"{out}.tmp-{os.getpid()}"
+    joblib.dump(flat, tmp_path, compress=compress)
+    os.replace(tmp_path, out)
+
+    scaler = joblib.load(os.path.join(artifacts_dir, SCALER_FILE))
+    if pipeline:
+        from utils.pipeline import write_pipelines
+        write_pipelines({FOREST_FILE: flat}, scaler, artifacts_dir)
+    return report(forest, flat, forest_path, out, scaler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Random Forest in a compact, compressed format")
+    parser.add_argument("--artifacts", default=ARTIFACTS_DIR, help="artifacts directory (default: %(default)s)")
+    parser.add_argument("--out", help=f"compact forest file (default: <artifacts>/{COMPACT_FILE})")
+    parser.add_argument("--max-depth", type=int, help="prune splits below this depth")
+    parser.add_argument("--min-node-samples", type=int, help="prune splits of nodes with fewer training rows")
+    parser.add_argument("--compress", type=int, default=COMPRESS, help="zlib level, 0 for none (default: %(default)s)")
+    parser.add_argument("--pipeline", action="store_true", help="serve the compact forest through its pipeline")
+    parser.add_argument("--report", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    result = export(args.artifacts, args.out, args.max_depth, args.min_node_samples, args.compress, args.pipeline)
+    print_report(result)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
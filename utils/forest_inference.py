@@ -0,0 +1,187 @@
+# Fast inference for fitted RandomForestRegressor models.
+#
+# The trees are flattened into one set of node tables (feature, threshold,
+# packed children, leaf value) and evaluated with NumPy for all trees and
+# rows at once, skipping sklearn's per-call validation and thread dispatch.
+# That wins for interactive requests (a handful of rows); past SMALL_BATCH
+# rows the per-tree Cython traversal is faster than any NumPy gather loop, so
+# larger batches call each tree's compiled predict directly instead (still
+# without the forest-level overhead).
+#
+# Results match forest.predict() bit for bit: inputs are rounded to float32
+# like sklearn does, comparisons use the float64 thresholds, NaNs follow each
+# node's missing-value direction, and per-tree values are summed in tree
+# order before dividing by the number of trees.
+import weakref
+
+import numpy as np
+
+SMALL_BATCH = 8  # rows; at or below this the flat tables are fastest
+CHUNK_ROWS = 2048  # rows per pass when a forest has only its flat tables
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, children, missing_left, value, roots, max_depth, estimators=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children  # children[2 * node] = left, children[2 * node + 1] = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_trees = len(roots)
+        self.estimators = estimators  # fitted trees, for the large-batch path
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single-output forests are supported")
+        trees = [(t.children_left, t.children_right, t.feature, t.threshold, t.missing_go_to_left, t.value[:, 0, 0])
+                 for t in (estimator.tree_ for estimator in forest.estimators_)]
+        flat = cls.from_trees(trees)
+        flat.estimators = [estimator.tree_ for estimator in forest.estimators_]
+        return flat
+
+    @classmethod
+    def from_trees(cls, trees, compact=False):
+        # trees: (children_left, children_right, feature, threshold,
+        # missing_go_to_left, value) per tree in sklearn's layout (-1 = leaf).
+        # compact=True stores float32 thresholds/values and the narrowest
+        # integer types; thresholds are rounded down, which keeps every split
+        # exact for the float32-rounded inputs.
+        features, thresholds, children, missing, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for children_left, children_right, feature, threshold, missing_left, value in trees:
+            n = len(children_left)
+            ids = np.arange(offset, offset + n)
+            is_leaf = children_left == -1
+
+            # Leaves point at themselves so every row can take max_depth steps
+            left = np.where(is_leaf, ids, children_left + offset)
+            right = np.where(is_leaf, ids, children_right + offset)
+            children.append(np.column_stack([left, right]).ravel())
+            features.append(np.where(is_leaf, 0, feature))
+            thresholds.append(threshold)
+            missing.append(np.asarray(missing_left).astype(bool))
+            values.append(value)
+            roots.append(offset)
+            max_depth = max(max_depth, _depth(children_left, children_right))
+            offset += n
+
+        index_type = np.int32 if 2 * offset < 2 ** 31 else np.int64
+        threshold = np.concatenate(thresholds).astype(np.float64)
+        if compact:
+            node_type = np.min_scalar_type(max(offset - 1, 0))
+            feature_type = np.min_scalar_type(max(int(np.concatenate(features).max()), 0))
+            rounded = threshold.astype(np.float32)
+            too_high = rounded.astype(np.float64) > threshold
+            rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+            return cls(
+                feature=np.concatenate(features).astype(feature_type),
+                threshold=rounded,
+                children=np.concatenate(children).astype(node_type),
+                missing_left=np.concatenate(missing),
+                value=np.concatenate(values).astype(np.float32),
+                roots=np.array(roots, dtype=index_type),
+                max_depth=max_depth,
+            )
+        return cls(
+            feature=np.concatenate(features).astype(index_type),
+            threshold=threshold,
+            children=np.concatenate(children).astype(index_type),
+            missing_left=np.concatenate(missing),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.array(roots, dtype=index_type),
+            max_depth=max_depth,
+        )
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children,
+                                      self.missing_left, self.value, self.roots))
+
+    def _step(self, nodes, x):
+        # One level down for every (row, tree): pick the right child where
+        # x > threshold, or where x is NaN and the node sends missing values right
+        go_right = x > self.threshold.take(nodes)
+        nan = np.isnan(x)
+        if nan.any():
+            go_right |= nan & ~self.missing_left.take(nodes)
+        # Child lookups in the roots' index type (compact forests store narrower ones)
+        return self.children.take(2 * nodes.astype(self.roots.dtype, copy=False) + go_right)
+
+    def _leaves(self, X):
+        # Leaf node per (row, tree) for a float64 matrix of float32-rounded inputs
+        n, n_features = X.shape
+        nodes = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        base = (np.arange(n, dtype=nodes.dtype) * n_features)[:, None]
+        flat_X = X.ravel()
+        for _ in range(self.max_depth):
+            nodes = self._step(nodes, flat_X.take(base + self.feature.take(nodes)))
+        return nodes
+
+    def _average(self, tree_values):
+        # Sequential (cumulative) sum in tree order, as sklearn accumulates it
+        return np.cumsum(tree_values, axis=-1, dtype=np.float64)[..., -1] / self.n_trees
+
+    def _predict_trees(self, X32):
+        out = np.zeros(len(X32), dtype=np.float64)
+        for tree in self.estimators:
+            out += tree.predict(X32)[:, 0]
+        return out / self.n_trees
+
+    def predict(self, X):
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        if X32.ndim != 2:
+            raise ValueError("X must be a 2D array")
+        if len(X32) > SMALL_BATCH and self.estimators is not None:
+            return self._predict_trees(X32)
+        if len(X32) > CHUNK_ROWS:
+            # No compiled trees (compact export): bound the (rows, trees) node arrays
+            return np.concatenate([self.predict(X32[i:i + CHUNK_ROWS]) for i in range(0, len(X32), CHUNK_ROWS)])
+        return self._average(self.value.take(self._leaves(X32.astype(np.float64))))
+
+    def predict_one(self, x):
+        # Single row: one node per tree, no row dimension
+        x = np.asarray(x, dtype=np.float32).astype(np.float64).ravel()
+        nodes = self.roots.copy()
+        for _ in range(self.max_depth):
+            nodes = self._step(nodes, x.take(self.feature.take(nodes)))
+        return self._average(self.value.take(nodes))
+
+
+def _depth(children_left, children_right):
+    # Depth of a tree (edges on the longest root-to-leaf path), level by level
+    depth, frontier = 0, np.array([0])
+    while True:
+        frontier = frontier[children_left[frontier] != -1]
+        if not len(frontier):
+            return depth
+        frontier = np.concatenate([children_left[frontier], children_right[frontier]])
+        depth += 1
+
+
+_compiled = weakref.WeakKeyDictionary()  # fitted forest -> FlatForest
+
+
+def compiled(forest):
+    # FlatForest for a fitted forest, built once per model object
+    flat = _compiled.get(forest)
+    if flat is None:
+        flat = _compiled[forest] = FlatForest.from_sklearn(forest)
+    return flat
+
+
+def fast_predict(model, X):
+    # model.predict(X), through the flat tables when the model is a forest
+    # (or already is one, like the compact exports of utils/forest_export.py)
+    if isinstance(model, FlatForest):
+        flat = model
+    else:
+        from sklearn.ensemble import RandomForestRegressor  # deferred to keep app startup light
+
+        if not isinstance(model, RandomForestRegressor):
+            return model.predict(X)
+        flat = compiled(model)
+    if len(X) == 1:
+        return np.array([flat.predict_one(X[0])])
+    return flat.predict(X)
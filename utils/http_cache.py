@@ -0,0 +1,104 @@
+# Response compression and cache validation for the Flask server (enabled in
+# app.py).
+#
+# GET responses built in memory (the page shell, _dash-layout,
+# _dash-dependencies, /api/models) get a strong ETag: a hash of the body, so
+# it changes exactly when what they serve does (the dataset, artifacts or
+# code behind them). A request whose If-None-Match carries it is answered
+# with 304 Not Modified and no body. Dash's bundles keep their versioned
+# URLs and long max-age; everything else must revalidate (no-cache).
+# Assets are sent by Flask's send_file, which already validates them against
+# their own ETag; versioned asset URLs (?m=<mtime>) are cached for a year.
+#
+# Text responses (JSON callbacks and layouts, HTML, JS, CSS) of at least
+# COMPRESS_MIN_BYTES are compressed with brotli (when installed) or gzip,
+# whichever the client accepts. Compressed bodies are memoized by content
+# hash, so each worker compresses a given bundle or layout only once.
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+from utils.metrics import metrics
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSED_ENTRIES = 64  # memoized compressed bodies per worker
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+_lock = threading.Lock()
+_compressed = OrderedDict()  # (body hash, encoding) -> compressed body
+
+
+def _encoding(request):
+    # Best content coding the client accepts, or None
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(body, digest, encoding):
+    key = (digest, encoding)
+    with _lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+    if encoding == "br":
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    with _lock:
+        _compressed[key] = data
+        while len(_compressed) > COMPRESSED_ENTRIES:
+            _compressed.popitem(last=False)
+    return data
+
+
+def enable(server, assets_prefix="/assets/"):
+    from flask import request
+
+    @server.after_request
+    def _compress_and_validate(response):
+        if request.path.startswith(assets_prefix):
+            if request.args.get("m") and response.status_code in (200, 304):
+                response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+            return response
+        if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+            return response
+        if "Content-Encoding" in response.headers:
+            return response
+
+        compressible = (response.mimetype or "").startswith(COMPRESSIBLE)
+        body = response.get_data()
+        encoding = _encoding(request) if compressible and len(body) >= COMPRESS_MIN_BYTES else None
+        if compressible:
+            response.vary.add("Accept-Encoding")
+
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        if request.method in ("GET", "HEAD"):
+            # One ETag per representation, so gzip and identity bodies never mix
+            response.set_etag(f"{digest}-{encoding}" if encoding else digest)
+            if "Cache-Control" not in response.headers:
+                response.headers["Cache-Control"] = "no-cache"
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        if encoding:
+            data = _compress(body, digest, encoding)
+            response.set_data(data)
+            response.headers["Content-Encoding"] = encoding
+            metrics.inc("http_compressed_bytes_saved_total", len(body) - len(data), encoding=encoding)
+        return response
+
+    return server
@@ -0,0 +1,167 @@
+# Streaming ingestion of the raw retail transactions.
+#
+# Reads the source workbook (openpyxl read-only mode) or CSV in fixed-size
+# chunks, applies the notebook's cleaning steps to each chunk and appends the
+# result to a columnar store partitioned by InvoiceMonth:
+#
+#   <store>/InvoiceMonth=2010-12/part-00000/col_*.npy
+#
+# Memory use is bounded by the chunk size, not the size of the source.
+# ProductCode/CountryCode come from the persisted encoders (utils/encoders.py).
+#
+#   python -m utils.ingest "Online Retail.xlsx" --out .cache/retail
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import read_columns, write_columns
+from utils.encoders import ENCODERS_PATH, load_encoders, save_encoders
+
+STORE_DIR = os.environ.get("RETAIL_STORE_DIR", os.path.join(".cache", "retail"))
+CHUNK_ROWS = 50_000
+CODES_FILE = "codes.json"
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    # Raw DataFrames of at most chunk_rows rows, in file order
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_rows, encoding_errors="replace")
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _as_text(column):
+    # Column as text; categorical ones (the dataset cache's) convert per category
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories.astype(str)
+        if categories.is_unique:
+            return column.cat.rename_categories(categories)
+    return column.astype(str)
+
+
+def clean_chunk(chunk, encoders):
+    # Drop rows with missing CustomerID or Description
+    chunk = chunk.dropna(subset=['CustomerID', 'Description'])
+
+    # Remove returns or incorrect entries
+    chunk = chunk[(chunk['Quantity'] > 0) & (chunk['UnitPrice'] > 0)].copy()
+
+    #Fix data type
+    chunk['InvoiceDate'] = pd.to_datetime(chunk['InvoiceDate'])
+    chunk['Quantity'] = chunk['Quantity'].astype(np.int64)
+    chunk['UnitPrice'] = chunk['UnitPrice'].astype(float)
+    chunk['CustomerID'] = chunk['CustomerID'].astype(np.int64)
+    for col in ['InvoiceNo', 'StockCode', 'Description', 'Country']:
+        chunk[col] = _as_text(chunk[col])
+
+    #create new columns to split the invoice date (months formatted once per distinct month)
+    months = chunk['InvoiceDate'].dt.year * 100 + chunk['InvoiceDate'].dt.month
+    chunk['InvoiceMonth'] = months.map({m: f"{m // 100}-{m % 100:02d}" for m in months.unique()})
+    chunk['DayOfWeek'] = chunk['InvoiceDate'].dt.dayofweek
+    chunk['Hour'] = chunk['InvoiceDate'].dt.hour
+
+    # Turn category values into numbers (stable codes, new values appended)
+    chunk['CountryCode'] = encoders['CountryCode'].encode(chunk['Country'], grow=True)
+    chunk['ProductCode'] = encoders['ProductCode'].encode(chunk['StockCode'], grow=True)
+    return chunk
+
+
+def clean_chunks(chunks, encoders_path=ENCODERS_PATH, save=True):
+    # clean_chunk() over raw chunks with the encoders artifact. Like ingest(),
+    # codes given to new categories are saved back to it (once the chunks are
+    # exhausted), so they can be resolved and are never handed out twice.
+    # Only the offline commands save; readers (save=False) encode with a
+    # private copy and leave the shared artifact alone.
+    encoders = load_encoders(encoders_path)
+    known = {name: len(encoder) for name, encoder in encoders.items()}
+    for chunk in chunks:
+        yield clean_chunk(chunk, encoders)
+    if save and any(len(encoder) != known[name] for name, encoder in encoders.items()):
+        save_encoders(encoders, encoders_path)
+
+
+def ingest(source, out_dir=STORE_DIR, chunk_rows=CHUNK_ROWS, encoders_path=ENCODERS_PATH):
+    # Rebuild the partitioned store from source; returns a small summary dict.
+    # Categories not yet in the encoders artifact are appended to it.
+    staging = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    encoders = load_encoders(encoders_path)
+    parts = {}  # partition -> number of parts written
+    rows_in = rows_out = 0
+    start = time.perf_counter()
+
+    for chunk in iter_chunks(source, chunk_rows):
+        rows_in += len(chunk)
+        cleaned = clean_chunk(chunk, encoders)
+        rows_out += len(cleaned)
+        for month, part in cleaned.groupby('InvoiceMonth', sort=False):
+            partition = f"InvoiceMonth={month}"
+            index = parts.get(partition, 0)
+            write_columns(part.reset_index(drop=True),
+                          os.path.join(staging, partition, f"part-{index:05d}"))
+            parts[partition] = index + 1
+
+    # The store keeps a copy of the codes it was written with
+    save_encoders(encoders, os.path.join(staging, CODES_FILE))
+    save_encoders(encoders, encoders_path)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging, out_dir)
+    return {
+        "source": source,
+        "rows_read": rows_in,
+        "rows_written": rows_out,
+        "partitions": len(parts),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def iter_store(store_dir=STORE_DIR, columns=None, months=None):
+    # One memory-mapped DataFrame per stored part, optionally for some months only
+    for partition in sorted(os.listdir(store_dir)):
+        if not partition.startswith("InvoiceMonth="):
+            continue
+        if months is not None and partition.split("=", 1)[1] not in months:
+            continue
+        for part in sorted(os.listdir(os.path.join(store_dir, partition))):
+            yield read_columns(os.path.join(store_dir, partition, part), columns)
+
+
+def read_store(store_dir=STORE_DIR, columns=None, months=None):
+    # The whole store (or the selected columns/months) as one DataFrame
+    frames = list(iter_store(store_dir, columns, months))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a retail workbook/CSV into the partitioned store")
+    parser.add_argument("source", help="Online Retail .xlsx or .csv file")
+    parser.add_argument("--out", default=STORE_DIR, help="store directory (default: %(default)s)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    print(json.dumps(ingest(args.source, args.out, args.chunk_rows), indent=2))
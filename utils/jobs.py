@@ -0,0 +1,214 @@
+# Background jobs for work too slow for a Dash callback (batch scoring of
+# large uploads, retraining).
+#
+# Jobs run on a small process pool owned by the web worker that submitted
+# them, started from a fork server (forking the multi-threaded web worker
+# itself could copy a lock some thread holds into the job). Their state lives on disk (.cache/jobs/<id>.json), so any worker can
+# report progress to a polling page, and cancellation is a flag file the job
+# checks between chunks of work. Job ids reach us from the browser, so only
+# ids of the form submit() hands out are accepted. A job whose process (or,
+# while queued, whose submitting web worker) has died is reported as failed.
+# Partial results of failed or cancelled jobs are deleted right away; the
+# files of finished jobs after JOB_RETENTION_SECONDS.
+#
+# The Retrain button leaves the new version in artifacts/versions/ unless
+# RETRAIN_PROMOTE=1; promote it with python -m utils.train --promote-version.
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+JOB_DIR = os.environ.get("JOB_DIR", os.path.join(".cache", "jobs"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+SCORE_CHUNK_ROWS = 50_000
+RETRAIN_PROMOTE = os.environ.get("RETRAIN_PROMOTE", "0") == "1"
+JOB_ID = re.compile(r"[0-9a-f]{12}")
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _path(job_id, suffix=".json"):
+    if not isinstance(job_id, str) or not JOB_ID.fullmatch(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return os.path.join(JOB_DIR, f"{job_id}{suffix}")
+
+
+def _alive(pid):
+    if pid is None or os.name == "nt":  # os.kill(pid, 0) would terminate it on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load(job_id):
+    try:
+        with open(_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_job(job_id):
+    # The job's state, or None for unknown (or malformed) ids
+    job = _load(job_id)
+    if job is None:
+        return None
+    owner = {"running": job.get("pid"), "queued": job.get("owner")}.get(job["status"])
+    if owner is not None and not _alive(owner):
+        job = _load(job_id)  # re-read: it may have finished in the meantime
+        if job is not None and job["status"] in ("queued", "running"):
+            job = _update(job_id, status="failed", finished=time.time(),
+                          error=f"The job's process ({owner}) exited before it finished")
+    return job
+
+
+def _update(job_id, **changes):
+    job = _load(job_id) or {"id": job_id}
+    job.update(changes)
+    tmp_path = _path(job_id, f".json.tmp-{os.getpid()}-{threading.get_ident()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _path(job_id))
+    return job
+
+
+def cancel(job_id):
+    # Ask a job to stop; it notices at its next progress report
+    if read_job(job_id) is None:
+        return
+    open(_path(job_id, ".cancel"), "w").close()
+    job = read_job(job_id)
+    if job is not None and job["status"] == "queued":
+        _update(job_id, status="cancelled", finished=time.time())
+
+
+class Progress:
+    # Handed to job functions: report(fraction, message) records progress and
+    # raises JobCancelled once cancellation was requested
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def report(self, fraction, message=None):
+        if os.path.exists(_path(self.job_id, ".cancel")):
+            raise JobCancelled()
+        changes = {"progress": round(float(fraction), 4)}
+        if message is not None:
+            changes["message"] = message
+        _update(self.job_id, **changes)
+
+
+def _run(job_id, func, args):
+    # Runs in the pool process
+    if os.path.exists(_path(job_id, ".cancel")):
+        return
+    _update(job_id, status="running", started=time.time(), pid=os.getpid())
+    try:
+        result = func(Progress(job_id), *args)
+    except JobCancelled:
+        _remove(result_path(job_id))
+        _update(job_id, status="cancelled", finished=time.time())
+    except Exception as e:
+        _remove(result_path(job_id))
+        _update(job_id, status="failed", finished=time.time(), error=str(e),
+                traceback=traceback.format_exc())
+    else:
+        _update(job_id, status="done", progress=1.0, finished=time.time(), result=result)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prune():
+    # Delete the files of jobs that finished more than JOB_RETENTION_SECONDS ago
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for name in os.listdir(JOB_DIR):
+        job_id, ext = os.path.splitext(name)
+        if ext != ".json" or not JOB_ID.fullmatch(job_id):
+            continue
+        job = _load(job_id)
+        if job is not None and job["status"] in ("done", "failed", "cancelled") \
+                and job.get("finished", cutoff) < cutoff:
+            for suffix in (".csv", ".cancel", ".json"):
+                _remove(_path(job_id, suffix))
+
+
+def _start_method():
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def submit(kind, func, *args):
+    # Queue func(progress, *args) in the background; returns the job id
+    global _pool
+    os.makedirs(JOB_DIR, exist_ok=True)
+    _prune()
+    job_id = uuid.uuid4().hex[:12]
+    _update(job_id, kind=kind, status="queued", progress=0.0, message="Queued",
+            created=time.time(), owner=os.getpid())
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=JOB_WORKERS,
+                                        mp_context=multiprocessing.get_context(_start_method()))
+        _pool.submit(_run, job_id, func, args)
+    return job_id
+
+
+def result_path(job_id):
+    return _path(job_id, ".csv")
+
+
+# Job functions. They run in the pool processes, so they import what they need.
+
+def score_csv(progress, model_name, input_path):
+    # Score an uploaded CSV chunk by chunk into <job>.csv
+    from utils.scoring import score_frame
+
+    total = max(1, os.path.getsize(input_path))
+    output = result_path(progress.job_id)
+    rows = restock = 0
+    try:
+        with open(input_path, "rb") as source:
+            for i, chunk in enumerate(pd.read_csv(source, chunksize=SCORE_CHUNK_ROWS)):
+                scored = score_frame(model_name, chunk)
+                scored.to_csv(output, mode="w" if i == 0 else "a", header=i == 0, index=False)
+                rows += len(scored)
+                restock += int(scored["Restock"].sum())
+                progress.report(source.tell() / total, f"Scored {rows} rows")
+    finally:
+        os.remove(input_path)
+    return {"rows": rows, "restock": restock, "file": output}
+
+
+def retrain(progress, source, n_iter, cv, promote=False):
+    # Run the training pipeline; the new version is only promoted if asked to
+    from utils import train
+
+    progress.report(0.0, "Loading training data")
+    version_dir = train.run(
+        source=source, n_iter=n_iter, cv=cv, promote_version=promote,
+        log=lambda message: None,
+        progress=lambda done, total: progress.report(0.9 * done / total, f"Fitted {done}/{total} folds"),
+    )
+    return {"version": version_dir, "promoted": promote}
@@ -0,0 +1,271 @@
+# In-process performance metrics: latency/size histograms, counters and
+# gauges, exposed in the Prometheus text format at /metrics and summarized on
+# the Performance page.
+#
+# Every worker process keeps its own numbers and periodically writes a
+# snapshot to .cache/metrics/<pid>.json, so whichever worker answers a scrape
+# can report all of them (each series carries a worker label). Snapshots not
+# refreshed for STALE_SECONDS are treated as belonging to dead workers.
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(".cache", "metrics"))
+FLUSH_SECONDS = 5
+STALE_SECONDS = 300
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROW_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    def __init__(self):
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> {"buckets", "counts", "sum", "count"}
+        self._collectors = []  # functions returning [(name, labels dict, value)] gauges
+        self._lock = threading.Lock()
+        self._flushed = 0.0
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        # Observe the wall time of the with-block into the histogram `name`
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector):
+        # collector() -> [(name, labels dict, value)], evaluated at snapshot time
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        gauges = [("process_resident_memory_bytes", {}, resident_memory())]
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            gauges.append(("process_peak_resident_memory_bytes", {}, peak))
+        for collector in self._collectors:
+            try:
+                gauges.extend(collector())
+            except Exception:
+                pass
+
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "time": time.time(),
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, dict(labels), dict(h, counts=list(h["counts"]))]
+                               for (name, labels), h in self._histograms.items()],
+                "gauges": [[name, labels, float(value)] for name, labels, value in gauges],
+            }
+
+    def flush(self, force=False):
+        # Write this worker's snapshot for the others, at most every FLUSH_SECONDS
+        now = time.time()
+        if not force and now - self._flushed < FLUSH_SECONDS:
+            return
+        self._flushed = now
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+def resident_memory():
+    # Current RSS of this process in bytes (peak RSS where /proc is missing)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is not None:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+
+metrics = Metrics()
+
+
+def worker_snapshots():
+    # Fresh snapshot of this process plus the latest one of every live worker
+    snapshots = {os.getpid(): metrics.snapshot()}
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        names = []
+    now = time.time()
+    for name in names:
+        if not re.fullmatch(r"\d+\.json", name) or int(name[:-5]) in snapshots:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - snapshot["time"] > STALE_SECONDS:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snapshots[snapshot["pid"]] = snapshot
+    return [snapshots[pid] for pid in sorted(snapshots)]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def prometheus_text(snapshots):
+    # Prometheus text exposition of all series, labelled with their worker pid
+    series = {}  # name -> (type, [lines])
+    for snapshot in snapshots:
+        worker = {"worker": str(snapshot["pid"])}
+        for name, labels, value in snapshot["counters"]:
+            series.setdefault(name, ("counter", []))[1].append(
+                f"{name}{_format_labels({**labels, **worker})} {value}")
+        for name, labels, value in snapshot["gauges"]:
+            series.setdefault(name, ("gauge", []))[1].append(
+                f"{name}{_format_labels({**labels, **worker})} {value}")
+        for name, labels, h in snapshot["histograms"]:
+            lines = series.setdefault(name, ("histogram", []))[1]
+            cumulative = 0
+            for bound, count in zip(h["buckets"], h["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels({**labels, **worker, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels({**labels, **worker, 'le': '+Inf'})} {h['count']}")
+            lines.append(f"{name}_sum{_format_labels({**labels, **worker})} {h['sum']}")
+            lines.append(f"{name}_count{_format_labels({**labels, **worker})} {h['count']}")
+
+    out = []
+    for name in sorted(series):
+        kind, lines = series[name]
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def _quantile(buckets, counts, total, q):
+    # Upper bound of the bucket holding the q-th observation (inf past the last)
+    rank, seen = q * total, 0
+    for bound, count in zip(buckets, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+def histogram_summary(snapshots):
+    # One row per histogram series, merged over workers: count, mean and
+    # bucket-resolution p50/p95/p99
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, h in snapshot["histograms"]:
+            key = (name, _labels_key(labels))
+            total = merged.get(key)
+            if total is None or total["buckets"] != h["buckets"]:
+                merged[key] = dict(h, counts=list(h["counts"]))
+                continue
+            total["counts"] = [a + b for a, b in zip(total["counts"], h["counts"])]
+            total["sum"] += h["sum"]
+            total["count"] += h["count"]
+
+    rows = []
+    for (name, labels), h in sorted(merged.items()):
+        n = h["count"]
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels),
+            "count": n,
+            "mean": h["sum"] / n if n else 0.0,
+            "p50": _quantile(h["buckets"], h["counts"], n, 0.50),
+            "p95": _quantile(h["buckets"], h["counts"], n, 0.95),
+            "p99": _quantile(h["buckets"], h["counts"], n, 0.99),
+        })
+    return rows
+
+
+def _route_labels():
+    # Low-cardinality labels for the current request: the matched URL rule,
+    # and for Dash callbacks the output(s) being updated
+    from flask import request
+
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    labels = {"route": route, "method": request.method}
+    if route.endswith("_dash-update-component"):
+        payload = request.get_json(silent=True) or {}
+        labels["callback"] = payload.get("output", "")
+    return labels
+
+
+def instrument(server):
+    # Time every request on the Flask server, record response sizes and serve /metrics
+    from flask import Response, g
+
+    @server.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def _record(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            labels = _route_labels()
+            if labels["route"] != "/metrics":
+                metrics.observe("http_request_seconds", time.perf_counter() - start,
+                                status=response.status_code, **labels)
+                if not response.is_streamed and response.content_length is not None:
+                    metrics.observe("http_response_bytes", response.content_length, SIZE_BUCKETS, **labels)
+                metrics.inc("http_requests_total", status=response.status_code, **labels)
+            try:
+                metrics.flush()
+            except OSError:
+                pass
+        return response
+
+    @server.route("/metrics")
+    def _metrics():
+        return Response(prometheus_text(worker_snapshots()), mimetype="text/plain; version=0.0.4")
+
+    return server
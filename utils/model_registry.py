@@ -0,0 +1,153 @@
+# Lazily loaded, shared registry of the pickled artifacts in artifacts/.
+#
+# Nothing is unpickled until a model is first used. Each artifact is then
+# re-dumped once (per file version) in joblib's own format under
+# .cache/models and loaded from there with mmap_mode='r'. Plain numpy array
+# attributes (SVR support vectors, linear coefficients, the node tables of a
+# compact forest export) are then page-cache backed and shared between
+# workers; sklearn trees are not: their node arrays are rebuilt on the heap
+# when unpickled, and forest_inference adds flat tables for the fast path, so
+# a full Random Forest costs its size in every process. The app only loads
+# the inference pipelines (which contain the models), never the bare model
+# pickles as well. Files that change on disk are picked up on the next lookup.
+import os
+import threading
+import time
+import tracemalloc
+
+import joblib
+
+from utils.metrics import metrics
+
+ARTIFACTS_DIR = os.environ.get("ARTIFACTS_DIR", "artifacts")
+MMAP_DIR = os.environ.get("MODEL_CACHE_DIR", os.path.join(".cache", "models"))
+
+# Display name -> artifact file
+MODEL_FILES = {
+    "SVM": "SVR.pkl",
+    "Random Forest": "Random_Forest.pkl",
+    "Logistic Regression": "Linear_Regression.pkl",
+    "SGD Regressor": "SGD_Regressor.pkl",
+}
+SCALER_FILE = "scaler.pkl"
+
+
+def pipeline_file(model_file):
+    # Inference pipeline artifact of a model file (see utils/pipeline.py)
+    return f"{os.path.splitext(model_file)[0]}_pipeline.pkl"
+
+
+class ModelRegistry:
+    def __init__(self, artifacts_dir=ARTIFACTS_DIR, mmap_dir=MMAP_DIR):
+        self.artifacts_dir = artifacts_dir
+        self.mmap_dir = mmap_dir
+        self._entries = {}  # file name -> {"object", "version", stats...}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        # listener(filename, version) is called whenever an artifact is reloaded
+        self._listeners.append(listener)
+
+    def _version(self, filename):
+        stat = os.stat(os.path.join(self.artifacts_dir, filename))
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _mmap_copy(self, filename, version):
+        # joblib-format copy of the artifact for this file version
+        stem = os.path.splitext(filename)[0]
+        target = os.path.join(self.mmap_dir, f"{stem}-{version}.joblib")
+        if os.path.exists(target):
+            return target
+
+        os.makedirs(self.mmap_dir, exist_ok=True)
+        staging = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+        joblib.dump(joblib.load(os.path.join(self.artifacts_dir, filename)), staging)
+        os.replace(staging, target)
+
+        # Drop copies of older versions of the same artifact
+        for name in os.listdir(self.mmap_dir):
+            if name.startswith(f"{stem}-") and name != os.path.basename(target) and ".tmp-" not in name:
+                try:
+                    os.remove(os.path.join(self.mmap_dir, name))
+                except OSError:
+                    pass
+        return target
+
+    def _load(self, filename, version):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            path = self._mmap_copy(filename, version)
+            obj = joblib.load(path, mmap_mode="r")
+            load_seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        metrics.observe("model_load_seconds", load_seconds, artifact=filename)
+        return {
+            "object": obj,
+            "version": version,
+            "load_seconds": load_seconds,
+            "heap_bytes": peak,  # peak Python allocations while loading
+            "file_bytes": os.path.getsize(path),  # joblib copy; only its plain arrays are mapped
+            "loaded_at": time.time(),
+        }
+
+    def get(self, filename):
+        # The unpickled artifact, loading (or reloading after a change) on demand
+        version = self._version(filename)
+        entry = self._entries.get(filename)
+        if entry is not None and entry["version"] == version:
+            return entry["object"]
+
+        with self._lock:
+            previous = entry = self._entries.get(filename)
+            if entry is None or entry["version"] != version:
+                entry = self._load(filename, version)
+                self._entries[filename] = entry
+        if previous is not None and previous is not entry:
+            for listener in self._listeners:
+                listener(filename, version)
+        return entry["object"]
+
+    def pipeline(self, name):
+        # The model's inference pipeline: preprocessing, model and inverse scaling
+        if name not in MODEL_FILES:
+            raise KeyError(f"Unknown model: {name}")
+        return self.get(pipeline_file(MODEL_FILES[name]))
+
+    def version(self, filename):
+        # Version token of the loaded artifact (loads it if needed)
+        self.get(filename)
+        return self._entries[filename]["version"]
+
+    def available(self):
+        # Display names of the models whose inference pipelines exist
+        return [name for name, filename in MODEL_FILES.items()
+                if os.path.exists(os.path.join(self.artifacts_dir, pipeline_file(filename)))]
+
+    def stats(self):
+        # Load time and memory for every artifact loaded in this process
+        return [
+            {"file": filename, **{k: v for k, v in entry.items() if k != "object"}}
+            for filename, entry in sorted(self._entries.items())
+        ]
+
+
+registry = ModelRegistry()
+
+
+def _loaded_gauges():
+    gauges = []
+    for entry in registry.stats():
+        labels = {"artifact": entry["file"]}
+        gauges.append(("model_file_bytes", labels, entry["file_bytes"]))
+        gauges.append(("model_load_heap_bytes", labels, entry["heap_bytes"]))
+    return gauges
+
+
+metrics.add_collector(_loaded_gauges)
@@ -0,0 +1,219 @@
+# Incremental model updates from new transactions, instead of a full retrain.
+#
+#   python -m utils.online --source new_transactions.csv
+#   python -m utils.online --source .cache/retail --months 2011-12
+#
+# One update, on the new rows only:
+#   - the new rows are scaled with the existing scaler.pkl, which stays frozen:
+#     every model (updated or not) and its pipeline was fitted on that
+#     scaling, so moving it would change the predictions of models that were
+#     never refit; train_mean.csv/train_std.csv are combined with the new
+#     rows' statistics
+#   - the SGD Regressor takes one partial_fit pass (it is fitted on the
+#     training dataset first if there is no artifact for it yet)
+#   - the Random Forest gets --new-trees trees fitted on the new rows
+#     (warm_start), keeping at most --max-trees of the newest trees
+# Linear Regression and SVR have no incremental fit; they and their pipelines
+# are left as they are. The changed files are written as a new version under artifacts/versions/
+# (its manifest records the update) and promoted like utils.train does, so
+# the model registry picks them up on the next request without a restart.
+import argparse
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+from utils.data_store import DATASET_PATH, file_sha256
+from utils.encoders import ENCODERS_PATH
+from utils.scoring import FEATURES
+
+NEW_TREES = 10
+MAX_TREES = 300
+SGD_NAME = "SGD Regressor"
+
+
+class ScaledSGDRegressor(RegressorMixin, BaseEstimator):
+    # SGDRegressor on standardized features (ProductCode and the other codes
+    # are in the thousands, which plain SGD does not converge on). Both the
+    # feature statistics and the coefficients continue with partial_fit.
+    def __init__(self, alpha=0.0001, eta0=0.01, max_iter=20, random_state=42):
+        self.alpha = alpha
+        self.eta0 = eta0
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    def _sgd(self):
+        return SGDRegressor(alpha=self.alpha, eta0=self.eta0, max_iter=self.max_iter,
+                            tol=1e-4, random_state=self.random_state)
+
+    def fit(self, X, y):
+        self.scaler_ = StandardScaler().fit(X)
+        self.sgd_ = self._sgd().fit(self.scaler_.transform(X), y)
+        return self
+
+    def partial_fit(self, X, y):
+        if not hasattr(self, "sgd_"):
+            self.scaler_, self.sgd_ = StandardScaler(), self._sgd()
+        self.scaler_.partial_fit(X)
+        self.sgd_.partial_fit(self.scaler_.transform(X), y)
+        return self
+
+    def predict(self, X):
+        return self.sgd_.predict(self.scaler_.transform(X))
+
+
+def load_new_rows(source, months=None):
+    # Cleaned FEATURES + Quantity of the new transactions: a file, or an
+    # ingested store (optionally only some months)
+    from utils.ingest import read_store
+    from utils.train import TARGET, load_training_frame
+
+    columns = FEATURES + [TARGET]
+    if months:
+        return read_store(source, columns=columns, months=set(months))[columns]
+    return load_training_frame(source)
+
+
+def combine_statistics(mean, std, rows, new):
+    # Mean/std (ddof=1, like DataFrame.std) of two row sets from their parts
+    n = rows + len(new)
+    new_mean, new_std = new.mean(), new.std().fillna(0)
+    delta = new_mean - mean
+    m2 = std ** 2 * (rows - 1) + new_std ** 2 * (len(new) - 1) + delta ** 2 * rows * len(new) / n
+    return mean + delta * len(new) / n, np.sqrt(m2 / (n - 1))
+
+
+def _read_statistic(path):
+    return pd.read_csv(path, index_col=0).iloc[:, 0]
+
+
+def _update_forest(forest, X, y, new_trees, max_trees):
+    # Fit new_trees more trees on X/y; the oldest beyond max_trees are dropped
+    forest.set_params(warm_start=True, n_jobs=1, n_estimators=len(forest.estimators_) + new_trees)
+    forest.fit(X, y)
+    if len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    return forest
+
+
+def update(source, months=None, new_trees=NEW_TREES, max_trees=MAX_TREES, promote_version=True, log=print):
+    # One incremental update; returns the new version directory (None if
+    # there were no new rows)
+    from utils import train
+    from utils.pipeline import write_pipelines
+
+    start = time.perf_counter()
+    frame = load_new_rows(source, months)
+    if frame.empty:
+        log(f"No new rows in {source}")
+        return None
+    log(f"Loaded {len(frame)} new rows from {source}")
+
+    artifacts = train.ARTIFACTS_DIR
+    scaler = joblib.load(os.path.join(artifacts, "scaler.pkl"))
+    try:
+        with open(os.path.join(artifacts, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    rows = manifest.get("train_rows") or int(np.max(scaler.n_samples_seen_))
+
+    # The new rows on the scaling every model was trained on
+    frame[['UnitPrice', 'Quantity']] = scaler.transform(frame[['UnitPrice', 'Quantity']])
+    X, y = frame[FEATURES], frame[train.TARGET]
+
+    mean = _read_statistic(os.path.join(artifacts, "train_mean.csv"))
+    std = _read_statistic(os.path.join(artifacts, "train_std.csv"))
+    mean, std = combine_statistics(mean[FEATURES], std[FEATURES], rows, X)
+
+    X_new, y_new = X.to_numpy(dtype=float), y.to_numpy(dtype=float)
+    updated = {}
+    sgd_path = os.path.join(artifacts, train.MODEL_FILES[SGD_NAME])
+    if os.path.exists(sgd_path):
+        updated[SGD_NAME] = joblib.load(sgd_path).partial_fit(X_new, y_new)
+    else:
+        log(f"No {SGD_NAME} artifact yet, fitting it on {DATASET_PATH} first")
+        base = train.load_training_frame(DATASET_PATH)
+        base[['UnitPrice', 'Quantity']] = scaler.transform(base[['UnitPrice', 'Quantity']])
+        sgd = train.make_model(SGD_NAME, {}).fit(base[FEATURES].to_numpy(dtype=float),
+                                                 base[train.TARGET].to_numpy(dtype=float))
+        updated[SGD_NAME] = sgd.partial_fit(X_new, y_new)
+
+    forest_path = os.path.join(artifacts, train.MODEL_FILES["Random Forest"])
+    if os.path.exists(forest_path):
+        updated["Random Forest"] = _update_forest(joblib.load(forest_path), X_new, y_new, new_trees, max_trees)
+
+    # New version with the changed files; the manifest keeps the entries
+    # (and CV scores) of the models this update did not touch
+    version = time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(train.VERSIONS_DIR, version)
+    staging = f"{target}.tmp-{os.getpid()}"
+    os.makedirs(staging)
+    for name, model in updated.items():
+        joblib.dump(model, os.path.join(staging, train.MODEL_FILES[name]))
+    mean.to_csv(os.path.join(staging, "train_mean.csv"))
+    std.to_csv(os.path.join(staging, "train_std.csv"))
+    if os.path.exists(ENCODERS_PATH):  # grown by load_new_rows if the rows had new codes
+        shutil.copy2(ENCODERS_PATH, os.path.join(staging, "encoders.json"))
+
+    write_pipelines({train.MODEL_FILES[name]: model for name, model in updated.items()}, scaler, staging)
+
+    models = dict(manifest.get("models", {}))
+    for name, model in updated.items():
+        entry = {"file": train.MODEL_FILES[name], "updates": models.get(name, {}).get("updates", 0) + 1}
+        if name == "Random Forest":
+            entry["trees"] = len(model.estimators_)
+        # Search scores and metrics described the model before the update
+        previous = {k: v for k, v in models.get(name, {}).items() if k not in ("cv_r2_mean", "cv_r2_std", "metrics")}
+        models[name] = {**previous, **entry}
+    files = dict(manifest.get("files", {}))
+    files.update({name: file_sha256(os.path.join(staging, name)) for name in sorted(os.listdir(staging))})
+    manifest = {
+        **manifest,
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parent": manifest.get("version"),
+        "update": {"source": source, "months": months, "rows": len(frame), "models": list(updated)},
+        "train_rows": rows + len(frame),
+        "models": models,
+        "files": files,
+    }
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(staging, target)
+    log(f"Wrote {target} ({', '.join(updated)} updated) in {time.perf_counter() - start:.1f}s")
+
+    if promote_version:
+        train.promote(target)
+        log(f"Promoted {target} to {artifacts}/")
+
+        from utils.evaluation import refresh
+        refresh()
+        log("Refreshed the evaluation snapshot")
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the models incrementally with new transactions")
+    parser.add_argument("--source", required=True, help="new transactions (.xlsx/.csv) or an ingested store directory")
+    parser.add_argument("--months", nargs="+", help="with a store: only these InvoiceMonth partitions (YYYY-MM)")
+    parser.add_argument("--new-trees", type=int, default=NEW_TREES,
+                        help="trees added to the Random Forest (default: %(default)s)")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES,
+                        help="newest trees kept in the Random Forest (default: %(default)s)")
+    parser.add_argument("--no-promote", action="store_true", help="only write the new version")
+    args = parser.parse_args(argv)
+
+    return update(args.source, args.months, args.new_trees, args.max_trees, not args.no_promote)
+
+
+if __name__ == "__main__":
+    main()
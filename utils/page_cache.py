@@ -0,0 +1,55 @@
+# Memoized page components, built on first use instead of at import.
+#
+# Page modules define layout() functions and fetch their expensive parts
+# (figures, tables, whole layouts) through cached(). Each part is built once
+# per version token (dataset fingerprint, snapshot timestamp, ...) and then
+# reused by every later visit; a new token rebuilds it. Worker start only
+# imports the pages, and each page's cost is paid when it is first visited,
+# or ahead of time by warm_up_in_background() (set WARM_UP_PAGES=1).
+import os
+import threading
+
+import dash
+
+from utils.metrics import metrics
+
+_lock = threading.Lock()
+_entries = {}  # name -> (version, component)
+_build_locks = {}  # name -> lock, so concurrent first visits build once
+
+
+def cached(name, version, build):
+    # build() for (name, version), memoized; only the latest version is kept
+    entry = _entries.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    with _lock:
+        build_lock = _build_locks.setdefault(name, threading.Lock())
+    with build_lock:
+        entry = _entries.get(name)
+        if entry is None or entry[0] != version:
+            with metrics.timer("page_component_build_seconds", component=name):
+                entry = _entries[name] = (version, build())
+    return entry[1]
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def warm_up():
+    # Render every registered page once so its components are cached
+    for page in list(dash.page_registry.values()):
+        layout = page.get("layout")
+        if callable(layout):
+            try:
+                layout()
+            except Exception as e:
+                print(f"Warm-up of {page['path']} failed: {e}")
+
+
+def warm_up_in_background():
+    if os.environ.get("WARM_UP_PAGES", "0") == "1":
+        threading.Thread(target=warm_up, name="page-warm-up", daemon=True).start()
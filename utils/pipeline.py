@@ -0,0 +1,89 @@
+# Serialized inference pipelines: one artifact per model that turns raw
+# feature rows into predicted quantities in original units.
+#
+#   python -m utils.pipeline            # (re)build them for artifacts/
+#
+# Training standardizes UnitPrice and the Quantity target with scaler.pkl
+# (fitted on exactly those two columns) and leaves the codes, Hour and
+# DayOfWeek as they are. A pipeline stores the model together with those
+# training statistics and applies them the same way in one vectorized pass
+# over an (n, 5) float array: validate, standardize UnitPrice, predict, undo
+# the Quantity standardization. utils.train and utils.online write one
+# <model>_pipeline.pkl next to every model pickle; the app only loads these.
+# (train_mean.csv/train_std.csv describe the model inputs after this
+# preprocessing, so they are not applied again.)
+import argparse
+import os
+
+import joblib
+import numpy as np
+
+from utils.forest_inference import fast_predict
+from utils.model_registry import ARTIFACTS_DIR, SCALER_FILE, pipeline_file
+from utils.scoring import FEATURES
+
+SCALED_COLUMNS = ['UnitPrice', 'Quantity']  # what scaler.pkl was fitted on, in order
+
+
+class InferencePipeline:
+    def __init__(self, model, scaler):
+        names = getattr(scaler, "feature_names_in_", None)
+        if names is not None and list(names) != SCALED_COLUMNS:
+            raise ValueError(f"Scaler was fitted on {list(names)}, expected {SCALED_COLUMNS}")
+        self.model = model
+        self.features = list(FEATURES)
+        self.price_column = FEATURES.index('UnitPrice')
+        self.price_mean, self.quantity_mean = (float(v) for v in scaler.mean_)
+        self.price_scale, self.quantity_scale = (float(v) for v in scaler.scale_)
+
+    def validate(self, X):
+        # Own float64 copy of X as an (n, 5) array, or ValueError
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"Expected rows of {len(self.features)} features "
+                             f"({', '.join(self.features)}), got shape {X.shape}")
+        bad = ~np.isfinite(X).all(axis=0)
+        if bad.any():
+            raise ValueError(f"Missing or non-numeric values in {', '.join(np.array(self.features)[bad])}")
+        return X
+
+    def predict(self, X):
+        # Predicted quantity (original units, at least 0) for every row of X
+        X = self.validate(X)
+        X[:, self.price_column] -= self.price_mean
+        X[:, self.price_column] /= self.price_scale
+
+        y = np.asarray(fast_predict(self.model, X), dtype=np.float64)
+        y *= self.quantity_scale
+        y += self.quantity_mean
+        return np.maximum(y, 0, out=y)
+
+
+def write_pipelines(models, scaler, directory):
+    # <model>_pipeline.pkl in directory for every {model file: fitted model}
+    for model_file, model in models.items():
+        path = os.path.join(directory, pipeline_file(model_file))
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(InferencePipeline(model, scaler), tmp_path)
+        os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    from utils.train import MODEL_FILES
+
+    parser = argparse.ArgumentParser(description="Build the inference pipeline artifacts from the model pickles")
+    parser.add_argument("--artifacts", default=ARTIFACTS_DIR, help="artifacts directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    scaler = joblib.load(os.path.join(args.artifacts, SCALER_FILE))
+    models = {filename: joblib.load(os.path.join(args.artifacts, filename))
+              for filename in MODEL_FILES.values() if os.path.exists(os.path.join(args.artifacts, filename))}
+    write_pipelines(models, scaler, args.artifacts)
+    for filename in models:
+        print(f"Wrote {os.path.join(args.artifacts, pipeline_file(filename))}")
+
+
+if __name__ == "__main__":
+    # Run through the imported module so pickles reference utils.pipeline, not __main__
+    from utils.pipeline import main
+    main()
@@ -0,0 +1,126 @@
+# Cache of single-row predictions, keyed on the model, the version of the
+# artifacts it was computed with, and the input vector.
+#
+# In-process entries live in a size-bounded LRU with a TTL. Setting
+# PREDICTION_CACHE_DB to a file path adds a SQLite table shared by every
+# gunicorn worker on the machine, consulted on local misses. Entries for a
+# model are dropped when the registry reloads one of its artifacts.
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import metrics
+
+MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_SIZE", 10_000))
+TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL", 600))
+SHARED_DB = os.environ.get("PREDICTION_CACHE_DB")
+
+
+class SQLiteBackend:
+    # Shared cache table; one connection per thread, WAL so readers don't block
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS predictions ("
+                       "key TEXT PRIMARY KEY, model TEXT, value REAL, expires REAL)")
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=1)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires FROM predictions WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def put(self, key, model, value, ttl):
+        with self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                       (key, model, value, time.time() + ttl))
+
+    def drop_model(self, model):
+        with self._connection() as db:
+            db.execute("DELETE FROM predictions WHERE model = ? OR expires < ?", (model, time.time()))
+
+
+class PredictionCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (model, value, expires)
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = 0
+
+    @staticmethod
+    def make_key(model, version, features):
+        return f"{model}|{version}|" + ",".join(repr(float(f)) for f in features)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] >= now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self._store(key, key.split("|", 1)[0], value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, model, value):
+        with self._lock:
+            self._entries[key] = (model, value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, model, value):
+        self._store(key, model, value)
+        if self.backend is not None:
+            self.backend.put(key, model, value, self.ttl)
+
+    def drop_model(self, model):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] == model]:
+                del self._entries[key]
+        if self.backend is not None:
+            self.backend.drop_model(model)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+
+prediction_cache = PredictionCache(backend=SQLiteBackend(SHARED_DB) if SHARED_DB else None)
+metrics.add_collector(lambda: [(f"prediction_cache_{name}", {}, value)
+                               for name, value in prediction_cache.stats().items()])
@@ -0,0 +1,221 @@
+# Pre-aggregated rollup cubes of the cleaned transactions, for drill-down
+# charts that answer without rescanning the rows.
+#
+# The base cube has one cell per ProductCode x CountryCode x DayOfWeek x
+# Hour x InvoiceMonth (the notebook's features) holding the transaction
+# count, Quantity sum and revenue (Quantity * UnitPrice) sum, plus a sparse
+# histogram of Quantity over fixed log-spaced bins per cell for quantiles.
+# Every measure is additive, so any rollup is a filtered group-by sum of the
+# cells and cubes built for separate pieces of data merge by summing.
+#
+# That makes maintenance incremental: the ingested store (utils.ingest) gets
+# one cube per stored part, keyed by the part's content, persisted under
+# .cache/rollups and merged in memory; only new or changed parts are
+# aggregated again. Without a store, the dataset file is a single part.
+#
+# Building a cube never writes the shared encoders artifact (it runs in web
+# workers): store parts already carry the store's codes, and the dataset is
+# encoded with a private copy of the encoders that is kept with its cube.
+# The cube's encoders label its codes.
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import DATASET_PATH, file_sha256, fingerprint, load_dataset, read_columns, write_columns
+from utils.encoders import load_encoders, save_encoders
+from utils.ingest import CODES_FILE, STORE_DIR, clean_chunk
+from utils.metrics import metrics
+
+ROLLUP_DIR = os.environ.get("ROLLUP_CACHE_DIR", os.path.join(".cache", "rollups"))
+ROLLUP_VERSION = 2  # bump when the cube layout changes
+DIMENSIONS = ["ProductCode", "CountryCode", "DayOfWeek", "Hour", "InvoiceMonth"]
+MEASURES = ["count", "quantity", "revenue"]
+# Upper edges of the Quantity histogram bins (exact for small quantities)
+QUANTITY_BINS = np.unique(np.round(np.geomspace(1, 100_000, 64))).astype(np.int64)
+QUERY_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_part_keys = {}  # part directory -> (stat signature, content key)
+_shared = {}  # "key" and "cube" of the merged cube in this process
+
+
+def build_cells(frame):
+    # (cells, hist) for cleaned transactions with the dimension columns,
+    # Quantity and UnitPrice
+    frame = frame[DIMENSIONS + ["Quantity", "UnitPrice"]]
+    quantity = frame["Quantity"].to_numpy(dtype=np.int64)
+    base = frame[DIMENSIONS].assign(
+        count=1,
+        quantity=quantity,
+        revenue=quantity * frame["UnitPrice"].to_numpy(dtype=np.float64),
+        bin=np.searchsorted(QUANTITY_BINS, quantity),
+    )
+    cells = base.groupby(DIMENSIONS, observed=True, sort=False)[MEASURES].sum().reset_index()
+    hist = base.groupby(DIMENSIONS + ["bin"], observed=True, sort=False)["count"].sum().reset_index()
+    return _compact(cells), _compact(hist)
+
+
+def _compact(frame):
+    # Narrow integer types for the stored cube columns
+    types = {"ProductCode": np.int32, "CountryCode": np.int16, "DayOfWeek": np.int8, "Hour": np.int8,
+             "bin": np.int16, "count": np.int64, "quantity": np.int64, "revenue": np.float64}
+    return frame.astype({c: t for c, t in types.items() if c in frame.columns})
+
+
+def merge(pieces):
+    # Sum cubes of separate data into one
+    cells = pd.concat([c for c, _ in pieces], ignore_index=True)
+    hist = pd.concat([h for _, h in pieces], ignore_index=True)
+    if len(pieces) > 1:
+        cells = cells.groupby(DIMENSIONS, observed=True, sort=False)[MEASURES].sum().reset_index()
+        hist = hist.groupby(DIMENSIONS + ["bin"], observed=True, sort=False)["count"].sum().reset_index()
+    for frame in (cells, hist):
+        frame["InvoiceMonth"] = frame["InvoiceMonth"].astype(str).astype("category")
+    return cells, hist
+
+
+class RollupCube:
+    def __init__(self, cells, hist, key=None, encoders=None):
+        self.cells = cells
+        self.hist = hist
+        self.key = key
+        self.encoders = encoders  # {code column: CategoryEncoder} the cells were encoded with
+        self._results = OrderedDict()  # (by, filters) -> DataFrame
+        self._lock = threading.Lock()
+
+    def _mask(self, frame, filters):
+        mask = np.ones(len(frame), dtype=bool)
+        for dimension, values in filters:
+            column = frame[dimension]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # Compare the small integer codes, not the strings
+                wanted = column.cat.categories.get_indexer([str(v) for v in values])
+                mask &= np.isin(column.cat.codes.to_numpy(), wanted[wanted >= 0])
+            else:
+                mask &= np.isin(column.to_numpy(), values)
+        return mask
+
+    def query(self, by, filters=None):
+        # Measures per group of the `by` dimensions for the cells matching
+        # filters ({dimension: [values]}): count, quantity, revenue,
+        # mean_quantity and bin-resolution quantity_p50/p90. Memoized.
+        by = [by] if isinstance(by, str) else list(by)
+        filters = tuple(sorted((d, tuple(v)) for d, v in (filters or {}).items()))
+        key = (tuple(by), filters)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        with metrics.timer("rollup_query_seconds", by=",".join(by)):
+            cells = self.cells[self._mask(self.cells, filters)]
+            result = cells.groupby(by, observed=True)[MEASURES].sum()
+            result["mean_quantity"] = result["quantity"] / result["count"]
+
+            hist = self.hist[self._mask(self.hist, filters)]
+            counts = hist.groupby(by + ["bin"], observed=True)["count"].sum().unstack("bin", fill_value=0)
+            counts = counts.reindex(result.index, fill_value=0)
+            cumulative = counts.to_numpy().cumsum(axis=1)
+            edges = np.append(QUANTITY_BINS, np.iinfo(np.int64).max)[counts.columns.to_numpy()]
+            for name, q in (("quantity_p50", 0.5), ("quantity_p90", 0.9)):
+                rank = q * cumulative[:, -1:] if len(cumulative) else cumulative
+                result[name] = edges[(cumulative < rank).sum(axis=1)] if len(cumulative) else []
+            result = result.reset_index()
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > QUERY_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+
+def _store_parts(store_dir):
+    # [(content key, part directory)] for every part of the ingested store
+    parts = []
+    for partition in sorted(os.listdir(store_dir)):
+        if not partition.startswith("InvoiceMonth="):
+            continue
+        for part in sorted(os.listdir(os.path.join(store_dir, partition))):
+            directory = os.path.join(store_dir, partition, part)
+            manifest = os.path.join(directory, "manifest.json")
+            stat = os.stat(manifest)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            known = _part_keys.get(directory)
+            if known is None or known[0] != signature:
+                files = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+                known = _part_keys[directory] = (signature, file_sha256(*files)[:24])
+            parts.append((known[1], directory))
+    return parts
+
+
+def _part_frame(source, encoders):
+    # Cleaned transactions of one part: a store part directory or the dataset
+    # file (cleaned like utils.ingest does, encoders grown in place)
+    columns = DIMENSIONS + ["Quantity", "UnitPrice"]
+    if os.path.isdir(source):
+        return read_columns(source, columns)
+    return clean_chunk(load_dataset(source), encoders)[columns]
+
+
+def _part_cube(key, source):
+    # Cube of one part, from .cache/rollups when it was aggregated before, and
+    # for the dataset file the encoders its codes come from
+    directory = os.path.join(ROLLUP_DIR, f"{key}-v{ROLLUP_VERSION}")
+    codes_path = os.path.join(directory, CODES_FILE)
+    try:
+        cells, hist = read_columns(os.path.join(directory, "cells")), read_columns(os.path.join(directory, "hist"))
+        return cells, hist, load_encoders(codes_path) if os.path.exists(codes_path) else None
+    except FileNotFoundError:
+        pass
+
+    encoders = None if os.path.isdir(source) else load_encoders()  # private copy
+    with metrics.timer("rollup_build_seconds"):
+        cells, hist = build_cells(_part_frame(source, encoders))
+    staging = f"{directory}.tmp-{os.getpid()}-{threading.get_ident()}"
+    write_columns(cells, os.path.join(staging, "cells"))
+    write_columns(hist, os.path.join(staging, "hist"))
+    if encoders is not None:
+        save_encoders(encoders, os.path.join(staging, CODES_FILE))
+    try:
+        os.rename(staging, directory)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+    return cells, hist, encoders
+
+
+def default_source():
+    # The ingested store when there is one, otherwise the dataset file
+    return STORE_DIR if os.path.isdir(STORE_DIR) else DATASET_PATH
+
+
+def cube(source=None):
+    # Shared cube for the source, updated for new or changed parts
+    source = source or default_source()
+    if os.path.isdir(source):
+        parts = _store_parts(source)
+    else:
+        parts = [(fingerprint(source)[:24], source)]
+    key = tuple(k for k, _ in parts)
+
+    with _lock:
+        if _shared.get("key") == key:
+            return _shared["cube"]
+        os.makedirs(ROLLUP_DIR, exist_ok=True)
+        pieces = [_part_cube(k, part) for k, part in parts]
+        cells, hist = merge([(c, h) for c, h, _ in pieces])
+        if os.path.isdir(source):
+            encoders = load_encoders(os.path.join(source, CODES_FILE))  # what the store was written with
+        else:
+            encoders = pieces[0][2]
+        _shared["key"], _shared["cube"] = key, RollupCube(cells, hist, key, encoders)
+
+        # Drop cubes of parts that are gone
+        wanted = {f"{k}-v{ROLLUP_VERSION}" for k in key}
+        for name in os.listdir(ROLLUP_DIR):
+            if name not in wanted and ".tmp-" not in name:
+                shutil.rmtree(os.path.join(ROLLUP_DIR, name), ignore_errors=True)
+        return _shared["cube"]
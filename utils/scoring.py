@@ -0,0 +1,149 @@
+# Model scoring shared by the Predict page and the /api/predict endpoint.
+# Everything works on whole (n, 5) feature matrices so a catalogue of
+# thousands of products costs one pipeline call.
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.encoders import ENCODED_COLUMNS, encoders
+from utils.metrics import ROW_BUCKETS, metrics
+from utils.model_registry import MODEL_FILES, pipeline_file, registry
+from utils.prediction_cache import prediction_cache
+
+FEATURES = ['ProductCode', 'UnitPrice', 'Hour', 'DayOfWeek', 'CountryCode']
+RESTOCK_THRESHOLD = 10
+COMPARE_WORKERS = int(os.environ.get("COMPARE_WORKERS", "4"))
+REPORTED_ROWS = 5  # bad rows named in an error message
+
+_pool_lock = threading.Lock()
+_compare_pool = None  # threads shared by predict_all() calls, created on first use
+
+
+def encode_codes(frame):
+    # Fill ProductCode/CountryCode from raw StockCode/Country text where only
+    # the text columns were given
+    frame = frame.copy()
+    for code_column, text_column in ENCODED_COLUMNS.items():
+        if code_column in frame.columns or text_column not in frame.columns:
+            continue
+        codes = encoders()[code_column].encode(frame[text_column])
+        unknown = frame[text_column][codes < 0]
+        if len(unknown):
+            raise ValueError(f"Unknown {text_column} in {_rows(frame.index, codes < 0)}: "
+                             f"{', '.join(map(str, unknown.unique()[:REPORTED_ROWS]))}")
+        frame[code_column] = codes
+    return frame
+
+
+def _rows(index, mask):
+    # "rows 1, 4, 9" (1-based data rows) of the first few True entries of mask,
+    # numbered from the frame's index so chunks of a file (pd.read_csv with
+    # chunksize keeps counting) report rows of the whole file
+    rows = index[np.asarray(mask)]
+    if pd.api.types.is_integer_dtype(rows):
+        rows = rows + 1
+    listed = ', '.join(str(r) for r in rows[:REPORTED_ROWS])
+    return f"rows {listed}" + (f" and {len(rows) - REPORTED_ROWS} more" if len(rows) > REPORTED_ROWS else "")
+
+
+def prepare_frame(frame):
+    # Copy of frame with encoded codes and numeric feature columns, checked
+    # up front so a batch fails before any of it is scored; ValueError names
+    # the missing columns or the rows with unknown/non-numeric values
+    frame = encode_codes(frame)
+    missing = [f for f in FEATURES if f not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    problems = []
+    for column in FEATURES:
+        values = pd.to_numeric(frame[column], errors="coerce").astype(float)
+        invalid = ~np.isfinite(values.to_numpy())
+        if invalid.any():
+            problems.append(f"{column} ({_rows(frame.index, invalid)})")
+        elif not pd.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = values
+    if problems:
+        raise ValueError(f"Missing or non-numeric values in {'; '.join(problems)}")
+    return frame
+
+
+def resolve_code(code_column, value):
+    # A single ProductCode/CountryCode typed as either the code or the raw text
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        code = encoders()[code_column].code(value)
+        if code is None:
+            raise ValueError(f"Unknown {ENCODED_COLUMNS[code_column]}: {value}")
+        return float(code)
+
+
+def feature_matrix(frame):
+    # (n, 5) float matrix in model order from a DataFrame holding the feature
+    # columns (StockCode/Country may stand in for ProductCode/CountryCode)
+    frame = encode_codes(frame)
+    missing = [f for f in FEATURES if f not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return frame[FEATURES].to_numpy(dtype=float)
+
+
+def predict_quantities(model_name, X):
+    # Predicted restock quantity (original units) for every row of X, through
+    # the model's inference pipeline (utils/pipeline.py) from the registry
+    pipeline = registry.pipeline(model_name)
+    with metrics.timer("model_predict_seconds", model=model_name):
+        quantities = pipeline.predict(X)
+    metrics.observe("model_predict_rows", len(quantities), ROW_BUCKETS, model=model_name)
+    return quantities
+
+
+def predict_one(model_name, features):
+    # Single-row prediction, answered from the prediction cache when the same
+    # input was already scored with the same pipeline version
+    if model_name not in MODEL_FILES:
+        raise KeyError(f"Unknown model: {model_name}")
+    version = registry.version(pipeline_file(MODEL_FILES[model_name]))
+    key = prediction_cache.make_key(model_name, version, features)
+    quantity = prediction_cache.get(key)
+    if quantity is None:
+        quantity = float(predict_quantities(model_name, [features])[0])
+        prediction_cache.put(key, model_name, quantity)
+    return quantity
+
+
+def predict_all(features, models=None):
+    # {model: quantity} for one row scored by every available model at once.
+    # Each model runs on its own pool thread (tree and kernel predicts release
+    # the GIL), so the answer takes as long as the slowest model, not the sum.
+    global _compare_pool
+    models = registry.available() if models is None else models
+    with _pool_lock:
+        if _compare_pool is None:
+            _compare_pool = ThreadPoolExecutor(max_workers=COMPARE_WORKERS, thread_name_prefix="compare")
+    with metrics.timer("model_compare_seconds", models=len(models)):
+        futures = {name: _compare_pool.submit(predict_one, name, features) for name in models}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _invalidate(filename, version):
+    # Reloaded pipeline -> its cached predictions can no longer be served
+    for name, model_file in MODEL_FILES.items():
+        if filename == pipeline_file(model_file):
+            prediction_cache.drop_model(name)
+
+
+registry.add_listener(_invalidate)
+
+
+def score_frame(model_name, frame):
+    # Copy of the feature columns with the prediction and restock flag appended
+    frame = prepare_frame(frame)
+    quantities = predict_quantities(model_name, feature_matrix(frame))
+    scored = frame[[c for c in ENCODED_COLUMNS.values() if c in frame.columns] + FEATURES].copy()
+    scored['PredictedQuantity'] = quantities
+    scored['Restock'] = quantities > RESTOCK_THRESHOLD
+    return scored
@@ -0,0 +1,119 @@
+# Backend for DataTables running with page_action/sort_action/filter_action
+# set to 'custom': turns the table's filter_query/sort_by/page props into one
+# page of records, so the browser never receives more than a page of rows.
+import numpy as np
+import pandas as pd
+
+from utils.data_store import sort_order
+
+# Longest operators first so '>=' is not read as '>'
+OPERATORS = [
+    ("ge ", ">="), ("le ", "<="), ("lt ", "<"), ("gt ", ">"),
+    ("ne ", "!="), ("eq ", "="), ("contains ",), ("datestartswith ",),
+]
+
+
+def split_filter_part(filter_part):
+    # "{Quantity} >= 6" -> ("Quantity", "ge", 6)
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(operator, 1)
+            name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+
+            value_part = value_part.strip()
+            v0 = value_part[:1]
+            if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                value = value_part[1:-1].replace("\\" + v0, v0)
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+
+            # word operators need spaces after them in the filter string,
+            # but we don't want these later
+            return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def _coerce(series, value):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    if pd.api.types.is_float_dtype(series):
+        # Compare in the column's own precision (2.55 as float32, not float64)
+        return series.dtype.type(value)
+    if pd.api.types.is_numeric_dtype(series) and isinstance(value, str):
+        return float(value)
+    return value
+
+
+def filter_mask(frame, filter_query):
+    # Boolean row mask for a DataTable filter_query, or None when it keeps every row
+    mask = None
+    for filter_part in (filter_query or "").split(" && "):
+        if not filter_part.strip():
+            continue
+        name, operator, value = split_filter_part(filter_part)
+        if name not in frame.columns:
+            continue
+        series = frame[name]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Evaluate against the (few) categories, then expand through the codes
+            categories = pd.Series(series.cat.categories)
+            if operator in ("contains", "datestartswith"):
+                text = categories.astype(str)
+                hits = text.str.contains(str(value), regex=False) if operator == "contains" \
+                    else text.str.startswith(str(value))
+            elif operator in ("eq", "ne"):
+                hits = (categories.astype(str) == str(value).removesuffix(".0")) | (categories == value)
+                if operator == "ne":
+                    hits = ~hits
+            else:
+                continue
+            part = np.isin(series.cat.codes.to_numpy(), np.flatnonzero(hits.to_numpy()))
+        elif operator == "contains":
+            part = series.astype(str).str.contains(str(value), regex=False).to_numpy()
+        elif operator == "datestartswith":
+            part = series.astype(str).str.startswith(str(value)).to_numpy()
+        else:
+            try:
+                value = _coerce(series, value)
+            except ValueError:
+                continue
+            values = series.to_numpy()
+            part = {
+                "eq": values == value, "ne": values != value,
+                "lt": values < value, "le": values <= value,
+                "gt": values > value, "ge": values >= value,
+            }[operator]
+
+        mask = part if mask is None else mask & part
+    return mask
+
+
+def query_page(frame, page_current, page_size, sort_by, filter_query):
+    # Returns (records for the requested page, total number of pages)
+    if sort_by:
+        order = sort_order(sort_by[0]["column_id"], ascending=sort_by[0]["direction"] == "asc")
+    else:
+        order = np.arange(len(frame))
+
+    mask = filter_mask(frame, filter_query)
+    if mask is not None:
+        order = order[mask[order]]
+
+    page_current = page_current or 0
+    start = page_current * page_size
+    rows = frame.iloc[order[start:start + page_size]]
+    page_count = max(1, -(-len(order) // page_size))
+
+    # float32 columns are sent as their shortest repr (2.55, not 2.549999952...)
+    records = rows.to_dict("records")
+    for column in rows.columns:
+        if rows[column].dtype == np.float32:
+            for record, value in zip(records, rows[column].to_numpy()):
+                record[column] = float(str(value))
+    return records, page_count
@@ -0,0 +1,345 @@
+# Command-line training pipeline: the notebook's preprocessing, model search
+# and evaluation, producing the artifacts the app loads.
+#
+#   python -m utils.train --source .cache/retail --n-iter 10 --cv 5 --promote
+#   python -m utils.train --promote-version artifacts/versions/<timestamp>
+#
+# Every (model, parameter candidate, CV fold) fit is an independent task run
+# on a process pool. Each finished fold score is written to a fold cache keyed
+# by the training data's fingerprint, so an interrupted search resumes where
+# it stopped. Results go to a new versioned directory
+# artifacts/versions/<timestamp>/ with a manifest.json and an inference
+# pipeline per model (utils/pipeline.py); --promote copies them over the
+# files in artifacts/ (the model registry reloads them).
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, ParameterSampler, train_test_split
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from utils.data_store import DATASET_PATH, file_sha256
+from utils.encoders import ENCODERS_PATH
+from utils.ingest import clean_chunks, iter_chunks, read_store
+from utils.online import ScaledSGDRegressor
+from utils.pipeline import write_pipelines
+from utils.scoring import FEATURES
+
+ARTIFACTS_DIR = os.environ.get("ARTIFACTS_DIR", "artifacts")
+VERSIONS_DIR = os.path.join(ARTIFACTS_DIR, "versions")
+TRAINING_CACHE = os.path.join(".cache", "training")
+TARGET = "Quantity"
+
+# Artifact file per model, as the app expects them
+MODEL_FILES = {
+    "Linear Regression": "Linear_Regression.pkl",
+    "Random Forest": "Random_Forest.pkl",
+    "SVR": "SVR.pkl",
+    "SGD Regressor": "SGD_Regressor.pkl",
+}
+
+# Parameter distributions for the randomized search (from the notebook)
+PARAM_DISTRIBUTIONS = {
+    "Linear Regression": {},
+    "Random Forest": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [10, 20, None],
+        "min_samples_split": [2, 5],
+    },
+    "SVR": {
+        "C": [0.1, 1, 10],
+        "epsilon": [0.01, 0.1, 0.5],
+    },
+    "SGD Regressor": {
+        "alpha": [0.00001, 0.0001, 0.001],
+        "eta0": [0.001, 0.01],
+    },
+}
+
+
+def make_model(name, params):
+    if name == "Linear Regression":
+        return LinearRegression(**params)
+    if name == "Random Forest":
+        return RandomForestRegressor(random_state=42, n_jobs=1, **params)
+    if name == "SVR":
+        return SVR(kernel="linear", **params)  # Linear kernel for faster computation
+    if name == "SGD Regressor":
+        return ScaledSGDRegressor(**params)  # Can be updated incrementally (utils/online.py)
+    raise KeyError(f"Unknown model: {name}")
+
+
+def load_training_frame(source, encoders_path=ENCODERS_PATH, save_codes=True):
+    # Cleaned transactions from the partitioned store (a directory written by
+    # utils.ingest) or straight from a workbook/CSV, cleaned chunk by chunk.
+    # Like utils.ingest, categories not yet in the encoders artifact are
+    # appended to it, so the codes the models learn can be resolved (and are
+    # not handed out again to other values); save_codes=False for readers.
+    columns = FEATURES + [TARGET]
+    if os.path.isdir(source):
+        return read_store(source, columns=columns)[columns]
+    return pd.concat([chunk[columns] for chunk in clean_chunks(iter_chunks(source), encoders_path, save_codes)],
+                     ignore_index=True)
+
+
+def prepare(frame, seed=42):
+    # Scale UnitPrice and Quantity, then the notebook's 80/20 split
+    scaler = StandardScaler()
+    frame = frame.copy()
+    frame[['UnitPrice', 'Quantity']] = scaler.fit_transform(frame[['UnitPrice', 'Quantity']])
+    X = frame[FEATURES]
+    y = frame[TARGET]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed)
+    return scaler, X_train, X_test, y_train, y_test
+
+
+def data_fingerprint(X, y):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X.to_numpy(dtype=float)).tobytes())
+    digest.update(np.ascontiguousarray(y.to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _task_key(name, params, fold, cv, max_rows):
+    text = json.dumps([name, params, fold, cv, max_rows], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+def _train_rows(name, train_idx, max_rows, seed):
+    # Training rows for one fit; SVR can be capped because kernel SVR scales badly
+    if name == "SVR" and max_rows and len(train_idx) > max_rows:
+        return np.sort(np.random.default_rng(seed).choice(train_idx, max_rows, replace=False))
+    return train_idx
+
+
+def _fit_fold(task):
+    # Runs in a worker process: fit on one fold and return its R²
+    X = np.load(task["X"], mmap_mode="r")
+    y = np.load(task["y"], mmap_mode="r")
+    n = len(y)
+    train_idx, test_idx = list(KFold(task["cv"]).split(np.empty(n)))[task["fold"]]
+    train_idx = _train_rows(task["name"], train_idx, task["max_rows"], task["seed"])
+
+    model = make_model(task["name"], task["params"])
+    model.fit(X[train_idx], y[train_idx])
+    return task["key"], r2_score(y[test_idx], model.predict(X[test_idx]))
+
+
+def _fit_final(name, params, X_path, y_path, max_rows, seed):
+    # Runs in a worker process: refit the best candidate on the full training set
+    X = np.load(X_path, mmap_mode="r")
+    y = np.load(y_path, mmap_mode="r")
+    rows = _train_rows(name, np.arange(len(y)), max_rows, seed)
+    model = make_model(name, params)
+    model.fit(X[rows], y[rows])
+    return name, model
+
+
+def search(X_train, y_train, n_iter, cv, jobs, max_rows, seed, log=print, progress=None):
+    # Randomized search over every model, folds fanned out over a process pool.
+    # progress(done, total) is called after every fold; if it raises, queued
+    # folds are cancelled (finished ones stay cached).
+    fingerprint = data_fingerprint(X_train, y_train)
+    run_dir = os.path.join(TRAINING_CACHE, fingerprint)
+    fold_dir = os.path.join(run_dir, "folds")
+    os.makedirs(fold_dir, exist_ok=True)
+    X_path, y_path = os.path.join(run_dir, "X_train.npy"), os.path.join(run_dir, "y_train.npy")
+    if not os.path.exists(X_path):
+        np.save(X_path, X_train.to_numpy(dtype=float))
+        np.save(y_path, y_train.to_numpy(dtype=float))
+
+    candidates = {}  # model -> list of (params, [fold keys])
+    tasks, scores = [], {}
+    for name, distribution in PARAM_DISTRIBUTIONS.items():
+        sampled = list(ParameterSampler(distribution, n_iter=n_iter, random_state=seed)) if distribution else [{}]
+        candidates[name] = []
+        for params in sampled:
+            keys = []
+            for fold in range(cv):
+                key = _task_key(name, params, fold, cv, max_rows)
+                keys.append(key)
+                cached = os.path.join(fold_dir, f"{key}.json")
+                if os.path.exists(cached):
+                    with open(cached, encoding="utf-8") as f:
+                        scores[key] = json.load(f)["r2"]
+                else:
+                    tasks.append({"key": key, "name": name, "params": params, "fold": fold, "cv": cv,
+                                  "X": X_path, "y": y_path, "max_rows": max_rows, "seed": seed})
+            candidates[name].append((params, keys))
+
+    log(f"{len(tasks) + len(scores)} fold fits, {len(scores)} cached, {len(tasks)} to run on {jobs} workers")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        try:
+            futures = [pool.submit(_fit_fold, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                key, r2 = future.result()
+                scores[key] = r2
+                with open(os.path.join(fold_dir, f"{key}.json"), "w", encoding="utf-8") as f:
+                    json.dump({"r2": r2}, f)
+                log(f"  fold {done}/{len(tasks)} done")
+                if progress is not None:
+                    progress(done, len(tasks))
+
+            best = {}
+            for name, sampled in candidates.items():
+                ranked = []
+                for params, keys in sampled:
+                    fold_scores = np.array([scores[k] for k in keys])
+                    ranked.append((fold_scores.mean(), fold_scores.std(), params))
+                mean, std, params = max(ranked, key=lambda r: r[0])
+                best[name] = {"params": params, "cv_r2_mean": mean, "cv_r2_std": std}
+                log(f"Best parameters for {name}: {params} (CV R² {mean:.4f} ± {std:.4f})")
+
+            finals = [pool.submit(_fit_final, name, best[name]["params"], X_path, y_path, max_rows, seed)
+                      for name in best]
+            fitted = dict(future.result() for future in finals)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return best, fitted, fingerprint
+
+
+def inverse_transform_quantity(scaler, y):
+    # Undo the Quantity standardization (column 1 of the scaler)
+    return np.asarray(y) * scaler.scale_[1] + scaler.mean_[1]
+
+
+def score_predictions(scaler, y_train, y_test, y_pred_train, y_pred_test):
+    # The notebook's metric table for standardized targets and predictions
+    y_train_orig, y_test_orig = inverse_transform_quantity(scaler, y_train), inverse_transform_quantity(scaler, y_test)
+    train_orig, test_orig = inverse_transform_quantity(scaler, y_pred_train), inverse_transform_quantity(scaler, y_pred_test)
+    return {
+        "Train RMSE (Std)": float(np.sqrt(mean_squared_error(y_train, y_pred_train))),
+        "Test RMSE (Std)": float(np.sqrt(mean_squared_error(y_test, y_pred_test))),
+        "Train MAE (Std)": float(mean_absolute_error(y_train, y_pred_train)),
+        "Test MAE (Std)": float(mean_absolute_error(y_test, y_pred_test)),
+        "Train RMSE (Orig)": float(np.sqrt(mean_squared_error(y_train_orig, train_orig))),
+        "Test RMSE (Orig)": float(np.sqrt(mean_squared_error(y_test_orig, test_orig))),
+        "Train MAE (Orig)": float(mean_absolute_error(y_train_orig, train_orig)),
+        "Test MAE (Orig)": float(mean_absolute_error(y_test_orig, test_orig)),
+        "Train R²": float(r2_score(y_train, y_pred_train)),
+        "Test R²": float(r2_score(y_test, y_pred_test)),
+    }
+
+
+def evaluate(model, scaler, X_train, X_test, y_train, y_test):
+    y_pred_train = model.predict(X_train.to_numpy(dtype=float))
+    y_pred_test = model.predict(X_test.to_numpy(dtype=float))
+    return score_predictions(scaler, y_train, y_test, y_pred_train, y_pred_test)
+
+
+def write_version(fitted, best, metrics, scaler, X_train, fingerprint, source, versions_dir=VERSIONS_DIR):
+    # artifacts/versions/<timestamp>/ with the model pickles, scaler, training
+    # statistics and a manifest describing how they were produced
+    version = time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(versions_dir, version)
+    staging = f"{target}.tmp-{os.getpid()}"
+    os.makedirs(staging)
+
+    for name, model in fitted.items():
+        joblib.dump(model, os.path.join(staging, MODEL_FILES[name]))
+    write_pipelines({MODEL_FILES[name]: model for name, model in fitted.items()}, scaler, staging)
+    final_name = max(metrics, key=lambda name: metrics[name]["Test R²"])
+    joblib.dump(fitted[final_name], os.path.join(staging, "final_model.pkl"))
+    joblib.dump(scaler, os.path.join(staging, "scaler.pkl"))
+    X_train.mean().to_csv(os.path.join(staging, "train_mean.csv"))
+    X_train.std().to_csv(os.path.join(staging, "train_std.csv"))
+    if os.path.exists(ENCODERS_PATH):
+        shutil.copy2(ENCODERS_PATH, os.path.join(staging, "encoders.json"))
+
+    manifest = {
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source,
+        "data_fingerprint": fingerprint,
+        "train_rows": len(X_train),
+        "features": FEATURES,
+        "final_model": final_name,
+        "models": {
+            name: {"file": MODEL_FILES[name], **best[name], "metrics": metrics[name]}
+            for name in fitted
+        },
+        "files": {name: file_sha256(os.path.join(staging, name)) for name in sorted(os.listdir(staging))},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(staging, target)
+    return target
+
+
+def promote(version_dir, artifacts_dir=ARTIFACTS_DIR):
+    # Copy a version's files over the live artifacts, one atomic rename each
+    for name in sorted(os.listdir(version_dir)):
+        tmp_path = os.path.join(artifacts_dir, f".{name}.tmp-{os.getpid()}")
+        shutil.copy2(os.path.join(version_dir, name), tmp_path)
+        os.replace(tmp_path, os.path.join(artifacts_dir, name))
+
+
+def run(source=DATASET_PATH, n_iter=10, cv=5, jobs=None, svr_max_rows=20_000, seed=42,
+        out=VERSIONS_DIR, promote_version=False, log=print, progress=None):
+    # The whole pipeline; returns the new version directory
+    start = time.perf_counter()
+    frame = load_training_frame(source)
+    log(f"Loaded {len(frame)} rows from {source}")
+    scaler, X_train, X_test, y_train, y_test = prepare(frame, seed)
+
+    best, fitted, fingerprint = search(X_train, y_train, n_iter, cv, jobs or os.cpu_count(),
+                                       svr_max_rows, seed, log, progress)
+    metrics = {name: evaluate(model, scaler, X_train, X_test, y_train, y_test)
+               for name, model in fitted.items()}
+    version_dir = write_version(fitted, best, metrics, scaler, X_train, fingerprint, source, out)
+    log(f"Wrote {version_dir} in {time.perf_counter() - start:.1f}s")
+
+    if promote_version:
+        promote_and_refresh(version_dir, log)
+    return version_dir
+
+
+def promote_and_refresh(version_dir, log=print):
+    promote(version_dir)
+    log(f"Promoted {version_dir} to {ARTIFACTS_DIR}/")
+
+    from utils.evaluation import refresh
+    refresh()
+    log("Refreshed the evaluation snapshot")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the models and write versioned artifacts")
+    parser.add_argument("--source", default=DATASET_PATH,
+                        help="ingested store directory or .xlsx/.csv (default: %(default)s)")
+    parser.add_argument("--n-iter", type=int, default=10, help="candidates per tuned model")
+    parser.add_argument("--cv", type=int, default=5, help="cross-validation folds")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--svr-max-rows", type=int, default=20_000,
+                        help="cap on SVR training rows per fit, 0 for no cap (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=VERSIONS_DIR, help="versions directory (default: %(default)s)")
+    parser.add_argument("--promote", action="store_true", help="copy the new version into artifacts/")
+    parser.add_argument("--promote-version", metavar="DIR",
+                        help="only promote an existing version directory (e.g. one retrained from the app)")
+    args = parser.parse_args(argv)
+
+    if args.promote_version:
+        if not os.path.isfile(os.path.join(args.promote_version, "manifest.json")):
+            parser.error(f"{args.promote_version} is not a version directory")
+        promote_and_refresh(args.promote_version)
+        return args.promote_version
+
+    return run(args.source, args.n_iter, args.cv, args.jobs, args.svr_max_rows or None,
+               args.seed, args.out, args.promote)
+
+
+if __name__ == "__main__":
+    main()